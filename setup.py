@@ -31,9 +31,10 @@ setup(
   ],
   packages=['tabnetviz'],
   include_package_data=False,
-  install_requires=['pyyaml', 'yamlloader', 'pygraphviz', 'pandas', 'matplotlib',
-    'networkx', 'svgwrite'],
+  install_requires=['pyyaml', 'yamlloader', 'pygraphviz', 'pandas', 'numpy', 'matplotlib',
+    'networkx', 'svgwrite', 'numexpr'],
   python_requires='>=3.2',
-  entry_points={'console_scripts': ['tabnetviz=tabnetviz.__main__:main']}
+  entry_points={'console_scripts': ['tabnetviz=tabnetviz.__main__:main',
+    'tabnetviz-batch=tabnetviz.__main__:batchmain']}
   )
   
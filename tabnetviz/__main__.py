@@ -9,14 +9,22 @@
 # standard imports
 import sys
 import os
+import copy
+import shutil
+import glob
+import time
 import argparse
-from time import sleep
+import subprocess
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from collections import OrderedDict, Counter
 
 # 3rd party imports
 import yaml
 import yamlloader
 import pygraphviz as pgv
+import numpy as np
 import pandas as pd
 from matplotlib import cm, colors
 
@@ -24,6 +32,13 @@ from matplotlib import cm, colors
 from tabnetviz import __version__
 from tabnetviz.gvattrs import gvattrs
 from tabnetviz import netanalyzer
+from tabnetviz import nacache
+from tabnetviz import layoutcache
+from tabnetviz import dotlayout
+from tabnetviz import filewatch
+from tabnetviz import expressions
+from tabnetviz import tableio
+from tabnetviz.filewatch import mtime
 from tabnetviz import colorbarsvg
 from tabnetviz import configtemplate
 from tabnetviz.kwcheck import kwcheck
@@ -47,16 +62,19 @@ def tovarname(s):
 
 def checkkeywords(conf):
     '''check whether all config keywords are valid'''
-    s = 'networktype title layout graphattrs networkanalysis nodegroups edgegroups clusters'
+    s = 'networktype title layout layoutcache graphattrs nodegroups edgegroups clusters'
     top0kw = s.split() # toplevel keywords with no subkeywords
-    xtable = 'filetype file sheet noheader'.split()
-    etable = xtable+'sourcecolumn targetcolumn fromcytoscape'.split()
+    xtable = 'filetype file sheet noheader csvengine categorical'.split()
+    etable = xtable+'sourcecolumn targetcolumn fromcytoscape chunksize'.split()
     ntable = xtable+'idcolumn skipisolated'.split()
     # toplevel keywords with children
     top1kw = {'edgetable': etable,
               'nodetable': ntable,
               'outputfiles': 'drawing dot nodetableout edgetableout colorbars'.split(),
-              'remove': ['nodes', 'edges', 'keepisolatednodes']}
+              'remove': ['nodes', 'edges', 'keepisolatednodes'],
+              'networkanalysis': ['quantities', 'jobs', 'cachesize', 'backend', 'samples',
+                'seed'],
+              'startlayout': ['file', 'pin']}
     # toplevel keywords with grandkids
     top2kw = {'addrankings': 'table colexpr method reverse withingroup'.split(),
               'colormaps': 'type map'.split()}
@@ -95,113 +113,288 @@ def checkkeywords(conf):
                             validkw = ['type']+typekw[tp]
                             kwcheck(conf[kw][groupname][attrname], validkw, context=ct)
 
-def cont2disc(x, cdmap):
-    '''continuous-to-discrete mapping function'''
-    for h in list(cdmap)[:-1]:
-        if x <= h:
-            return cdmap[h]
-    return cdmap['higher']
-        
-def table2net(args):
-    '''create visualization'''
-    configfile = args.configfile
-    conf = parseconfig(configfile)
-    checkkeywords(conf) # do some input validation
-    
-    # read input files (edge and node table)
-    
-    sepchar = {'csv': ',', 'tsv': '\t'}
+def cont2disc(col, cdmap):
+    '''continuous-to-discrete mapping of a Series'''
+    limits = list(cdmap)[:-1]
+    mapped = np.array([cdmap[h] for h in cdmap], dtype=object)
+    # index of the first limit not smaller than the value; len(limits) means 'higher'
+    i = np.searchsorted(np.array(limits), col.values, side='left')
+    return pd.Series(mapped[i], index=col.index)
+
+# two-digit hex codes of color components
+hexcodes = np.array(['%02x' % i for i in range(256)], dtype=object)
+
+def tohex(rgba):
+    '''convert an array of RGBA colors (rows, as returned by a colormap) to #rrggbbaa strings'''
+    c = hexcodes[np.round(np.asarray(rgba)*255).astype(int)]
+    return '#'+c[:, 0]+c[:, 1]+c[:, 2]+c[:, 3]
+
+def setattrcol(attrs, prop, values):
+    '''store values (a Series) of a graphviz attribute in attribute table attrs'''
+    if prop not in attrs:
+        attrs[prop] = pd.Series(None, index=attrs.index, dtype=object)
+    attrs.loc[values.index, prop] = values.map(str) # graphviz attributes are strings
+
+def elementattrs(attrs):
+    '''iterate over the rows of attribute table attrs as dicts of the attributes set'''
+    props = list(attrs.columns)
+    if not props: # itertuples would yield nothing
+        for x in attrs.index:
+            yield {}
+        return
+    for values in attrs.itertuples(index=False, name=None):
+        yield {p: v for (p, v) in zip(props, values) if type(v) == str}
+
+def tablefile(conf, args, table):
+    '''file name of the edge or node table ('edgetable' or 'nodetable'), or None'''
+    if getattr(args, table): # specified on command line
+        return getattr(args, table)
+    if table not in conf:
+        return None
+    if type(conf[table]) == str: # only a filename is provided
+        return conf[table]
+    return conf[table]['file']
+
+def usedcolumns(conf):
+    '''names of the node and edge table columns referred to in the config
 
-    # load edge table
-    if args.edgetable: # file name specified on command line
-        if 'edgetable' not in conf:
-            conf['edgetable'] = {'file': args.edgetable}
+    Returns a dict with keys 'nodetable' and 'edgetable', the values are sets of column
+    names (original or converted to variable names), or None if all columns are needed.
+    '''
+    used = {'nodetable': set(), 'edgetable': set()}
+    exprs = {'nodetable': [], 'edgetable': []} # column expressions
+    for table in used:
+        tabconf = conf.get(table) or {}
+        if type(tabconf) != str:
+            used[table] |= set(str(tabconf.get(k)) for k in 
+              ['idcolumn', 'sourcecolumn', 'targetcolumn'] if k in tabconf)
+            if tabconf.get('fromcytoscape', False):
+                used[table] |= {'name', 'interaction'}
+        groups = conf.get(table[:4]+'groups') or {}
+        for grname in groups:
+            used[table].add(grname) # may be a Boolean column
+            if type(groups[grname]) == str:
+                exprs[table].append(groups[grname])
+        styles = conf.get(table[:4]+'styles') or {}
+        for grname in styles:
+            for prop in styles[grname] or {}:
+                propval = styles[grname][prop]
+                if type(propval) != OrderedDict:
+                    continue
+                if 'colexpr' in propval:
+                    exprs[table].append(propval['colexpr'])
+                if propval.get('type') == 'combine':
+                    used[table] |= set(map(str, propval.get('attrlist', [])))
+        if type(conf.get('remove')) == OrderedDict and table[:4]+'s' in conf['remove']:
+            exprs[table].append(conf['remove'][table[:4]+'s'])
+    for colname in conf.get('addrankings') or {}:
+        tt = conf['addrankings'][colname]
+        if tt.get('table') in exprs and 'colexpr' in tt:
+            exprs[tt['table']].append(tt['colexpr'])
+    for table in used:
+        for expr in exprs[table]:
+            names = expressions.names(expr)
+            if names is None: # cannot tell which columns are used
+                used[table] = None
+                break
+            used[table] |= names
+    # the whole table is needed if it is written out
+    if 'nodetableout' in conf.get('outputfiles', {}):
+        used['nodetable'] = None
+    if 'edgetableout' in conf.get('outputfiles', {}):
+        used['edgetable'] = None
+    return used
+
+def keepcolumns(columns, used, nfirst):
+    '''columns of a table file to load: those used and the first nfirst ones (defaults for
+    the id, source and target columns); None means all columns'''
+    if columns is None or used is None:
+        return None
+    return [c for (j, c) in enumerate(columns) if j < nfirst or c in used or 
+      tovarname(c) in used]
+
+def cachedir(args):
+    '''directory of the caches (next to the config file)'''
+    return os.path.join(os.path.dirname(os.path.abspath(args.configfile)), '.tabnetviz-cache')
+
+# tables read so far (all columns), keyed on the file and the way it is read; only used
+# in batch mode (a dict there), where the tables shared by the config files are read once
+tablememo = None
+
+def readtablefile(tabconf, used, keys, engine, cache, memo=False):
+    '''read the node or edge table file specified by tabconf (its config dict)
+
+    used: column names needed (None: all); keys: config keywords of the id or source and
+    target columns (the first columns by default); engine: default csv engine;
+    cache: DtypeCache or None. If a chunksize is given, an iterator of chunks is returned.
+    If memo is true, the whole table is kept in tablememo (in batch mode, see sharedtables),
+    and later reads of the same file take their columns from it.
+    '''
+    fname = tabconf['file']
+    header = None if tabconf.get('noheader', False) else 0
+    ftype = tabconf.get('filetype', tableio.filetype(fname))
+    sheet = tabconf.get('sheet', 0)
+    engine = tabconf.get('csvengine', engine)
+    columns = keepcolumns(tableio.columnnames(fname, ftype, header, sheet), used, len(keys))
+    categorical = tabconf.get('categorical', False)
+    # dtypes are only cached for text files read whole with categorical columns (chunks are
+    # categorized after they are put together, see loadtables)
+    if ftype not in tableio.sepchar or not categorical or tabconf.get('chunksize'):
+        cache = None
+    dtype = cache.get(fname, header, engine) if cache else None
+    if tabconf.get('chunksize'): # return an iterator of chunks
+        return tableio.readchunks(fname, ftype, int(tabconf['chunksize']), header=header,
+          sheet=sheet, columns=columns, engine=engine, dtype=dtype)
+    key = None
+    if tablememo is not None:
+        st = os.stat(fname)
+        # (the cached column types are those of the same file, so they are not in the key)
+        key = (os.path.abspath(fname), st.st_size, st.st_mtime_ns, ftype, header, sheet, engine,
+          categorical)
+        if memo and key not in tablememo:
+            tablememo[key] = tableio.readtable(fname, ftype, header=header, sheet=sheet,
+              engine=engine, dtype=dtype)
+    if key in (tablememo or {}):
+        tab = tablememo[key]
+        tab = (tab if columns is None else tab[columns]).copy() # modified by the caller
+    else:
+        tab = tableio.readtable(fname, ftype, header=header, sheet=sheet, columns=columns, 
+          engine=engine, dtype=dtype)
+    if categorical:
+        keycolumns = list(tab.columns[:len(keys)])+[tabconf[k] for k in keys if k in tabconf]
+        tableio.categorize(tab, keycolumns)
+    if cache:
+        cache.put(fname, header, engine, tab)
+    return tab
+
+def filteredges(chunks, conf, nodetab, idcolumn):
+    '''prepare the edge table from its chunks, removing edges on the fly if requested
+
+    Edges of the nodes to remove (remove/nodes) and those matching remove/edges are
+    dropped from each chunk, so only the remaining edges are kept in memory. If nodetab
+    is None (no node table), remove/nodes is evaluated on the node names of each chunk.
+    Returns (edgetab, sourcecolumn, targetcolumn, nodesfromedges, removednodes, isolnodes),
+    the latter three are the nodes in the original edge table (in a dict, as an ordered
+    set), and the sets of the nodes to remove and of the nodes to remove because they lost
+    all their edges by remove/edges.
+    '''
+    edgeconf = conf['edgetable']
+    remove = conf['remove'] if type(conf.get('remove')) == OrderedDict else {}
+    removednodes = set()
+    if 'nodes' in remove and nodetab is not None:
+        x = expressions.select(nodetab, remove['nodes'], 'remove/nodes')
+        removednodes = set(nodetab.loc[x, idcolumn])
+    nodesfromedges = None # nodes with edges (dict keys, in the order of the edge table)
+    lostedges = set() # nodes of removed edges
+    kept = []
+    for edgetab in chunks:
+        if edgeconf.get('fromcytoscape', False):
+            # for edge table exported from Cytoscape, separate source and target
+            srctarlist = [edgetab.at[x, 'name'].split(' ('+edgetab.at[x, 'interaction']+') ')
+              for x in edgetab.index]
+            edgetab['source'] = [src for [src, tar] in srctarlist]
+            edgetab['target'] = [tar for [src, tar] in srctarlist]
+        
+        if edgeconf.get('noheader', False):
+            edgetab.columns = ['col'+str(j) for j in range(1, edgetab.shape[1]+1)]
+            sourcecolumn = 'col1'
+            targetcolumn = 'col2'
         else:
-            conf['edgetable']['file'] = args.edgetable
-    if type(conf['edgetable']) == str: # only a filename is provided
-        conf['edgetable'] = {'file': conf['edgetable']}
-    etfile = conf['edgetable']['file']
-    header = None if conf['edgetable'].get('noheader', False) else 0
-    
-    if 'filetype' in conf['edgetable']:
-        ftype = conf['edgetable']['filetype']
-    elif etfile[-4:].lower() == '.csv':
-        ftype = 'csv'
-    elif etfile[-4:].lower() == '.tsv':
-        ftype = 'tsv'
-    elif ntfile[-5:].lower() == '.xlsx' or ntfile[-4:].lower() == '.xls':
-        ftype = 'xlsx'
+            sourcecolumn = edgeconf.get('sourcecolumn', edgetab.columns[0])
+            targetcolumn = edgeconf.get('targetcolumn', edgetab.columns[1])
         
-    if ftype in ['csv', 'tsv']:
-        edgetab = pd.read_csv(etfile, sep=sepchar[ftype], header=header)
-    elif ftype in ['xlsx', 'xls']:
-        edgetab = pd.read_excel(etfile, header=header, 
-          sheet_name=conf['edgetable'].get('sheet', 0))
-    else:
-        raise ValueError('Unknown edge table file type: %s' % (ftype))
-    
-    if conf['edgetable'].get('fromcytoscape', False):
-        # for edge table exported from Cytoscape, separate source and target
-        srctarlist = [edgetab.at[x, 'name'].split(' ('+edgetab.at[x, 'interaction']+') ')
-          for x in edgetab.index]
-        edgetab['source'] = [src for [src, tar] in srctarlist]
-        edgetab['target'] = [tar for [src, tar] in srctarlist]
+        if sourcecolumn not in edgetab.columns:
+            raise ValueError('Column "%s" not found in edge table' % (sourcecolumn))
+        if targetcolumn not in edgetab.columns:
+            raise ValueError('Column "%s" not found in edge table' % (targetcolumn))
         
-    if header == None:
-        edgetab.columns = ['col'+str(j) for j in range(1, edgetab.shape[1]+1)]
-        sourcecolumn = 'col1'
-        targetcolumn = 'col2'
-    else:
-        sourcecolumn = conf['edgetable'].get('sourcecolumn', edgetab.columns[0])
-        targetcolumn = conf['edgetable'].get('targetcolumn', edgetab.columns[1])
+        # (a dict as an ordered set, so that the inferred node table has the same order
+        # in every run)
+        nodes = dict.fromkeys(pd.concat([edgetab[sourcecolumn], edgetab[targetcolumn]],
+          ignore_index=True))
+        if nodesfromedges is None:
+            nodesfromedges = nodes
+        else:
+            nodesfromedges |= nodes
+        edgetab.columns = [tovarname(cname) for cname in edgetab.columns]
         
-    if sourcecolumn not in edgetab.columns:
-        raise ValueError('Column "%s" not found in edge table' % (sourcecolumn))
-    if targetcolumn not in edgetab.columns:
-        raise ValueError('Column "%s" not found in edge table' % (targetcolumn))
+        # remove nodes: delete the edges belonging to them
+        if 'nodes' in remove:
+            if nodetab is None: # nodes inferred from the edge table
+                chunknodes = pd.DataFrame({'name': list(nodes)})
+                x = expressions.select(chunknodes, remove['nodes'], 'remove/nodes')
+                removednodes |= set(chunknodes.loc[x, 'name'])
+            y = edgetab.index[edgetab[sourcecolumn].isin(removednodes) | 
+              edgetab[targetcolumn].isin(removednodes)]
+            edgetab.drop(index=y, inplace=True)
+        # remove edges
+        if 'edges' in remove:
+            x = expressions.select(edgetab, remove['edges'], 'remove/edges')
+            # nodes connected by the edges to remove
+            lostedges |= set(edgetab.loc[x, sourcecolumn]) | set(edgetab.loc[x, targetcolumn])
+            edgetab.drop(index=x, inplace=True) # delete edges
+        kept.append(edgetab)
     
-    # set of nodes with edges
-    nodesfromedges = set(edgetab[sourcecolumn]) | set(edgetab[targetcolumn])
+    edgetab = kept[0] if len(kept) == 1 else tableio.concatchunks(kept)
+    # nodes that have become isolated after edge removal, unless keeping them is requested
+    isolnodes = set()
+    if lostedges and not remove.get('keepisolatednodes', False):
+        nonisol = set(edgetab[sourcecolumn]) | set(edgetab[targetcolumn])
+        isolnodes = lostedges-nonisol
+    return (edgetab, sourcecolumn, targetcolumn, nodesfromedges, removednodes, isolnodes)
+
+def settablefiles(conf, args):
+    '''set the table file names from the config file and the command line'''
+    for table in ['edgetable', 'nodetable']:
+        if type(conf.get(table)) == str: # only a filename is provided
+            conf[table] = {'file': conf[table]}
+        if getattr(args, table): # file name specified on command line
+            if table not in conf:
+                conf[table] = {'file': getattr(args, table)}
+            else:
+                conf[table]['file'] = getattr(args, table)
+
+def loadtables(conf, args):
+    '''read the edge and node tables, remove nodes and edges if requested'''
+    used = usedcolumns(conf) # only these columns are loaded
+    settablefiles(conf, args)
+    cache = None if args.no_cache else tableio.DtypeCache(cachedir(args))
+    chunked = bool(conf['edgetable'].get('chunksize'))
+    # read the edge and node table files at the same time; in chunks, the edge table
+    # is read when the node table is ready (nodes to remove are needed)
+    nodetab = None
+    idcolumn = 'name'
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        etread = pool.submit(readtablefile, conf['edgetable'], used['edgetable'], 
+          ['sourcecolumn', 'targetcolumn'], args.csvengine, cache)
+        if 'nodetable' in conf:
+            ntread = pool.submit(readtablefile, conf['nodetable'], used['nodetable'],
+              ['idcolumn'], args.csvengine, cache)
+            nodetab = ntread.result()
+            idcolumn = conf['nodetable'].get('idcolumn', nodetab.columns[0])
+            if idcolumn not in nodetab.columns:
+                raise ValueError('Column "%s" not found in node table' % (idcolumn))
+            # convert column names to variable names
+            nodetab.columns = [tovarname(cname) for cname in nodetab.columns]
+            idcolumn = tovarname(idcolumn)
+        chunks = etread.result()
+        if not chunked:
+            chunks = [chunks]
+        (edgetab, sourcecolumn, targetcolumn, nodesfromedges, removednodes, isolnodes) = \
+          filteredges(chunks, conf, nodetab, idcolumn)
+    if chunked and conf['edgetable'].get('categorical', False):
+        tableio.categorize(edgetab, [sourcecolumn, targetcolumn])
     
-    # load node table
-    if 'nodetable' not in conf and not args.nodetable:
+    # nodes
+    if nodetab is None:
         # infer node table from edge table
-        nodes = set(edgetab[sourcecolumn]) | set(edgetab[targetcolumn])
         nodetab = pd.DataFrame()
-        nodetab['name'] = list(nodes)
+        nodetab['name'] = list(nodesfromedges)
         nodetab.index = list(nodetab['name'])
-        idcolumn = 'name'
     else:
-        if args.nodetable: # file specified on command line
-            if 'nodetable' not in conf:
-                conf['nodetable'] = {'file': args.nodetable}
-            else:
-                conf['nodetable']['file'] = args.nodetable
-        if type(conf['nodetable']) == str:
-            conf['nodetable'] = {'file': conf['nodetable']} # only a filename is given
-        ntfile = conf['nodetable']['file']
-        header = None if conf['nodetable'].get('noheader', False) else 0
-        if 'filetype' in conf['nodetable']:
-            ftype = conf['nodetable']['filetype']
-        elif ntfile[-4:].lower() == '.csv':
-            ftype = 'csv'
-        elif ntfile[-4:].lower() == '.tsv':
-            ftype = 'tsv'
-        elif ntfile[-5:].lower() == '.xlsx' or ntfile[-4:].lower() == '.xls':
-            ftype = 'xlsx'
-        if ftype in ['csv', 'tsv']:
-            nodetab = pd.read_csv(ntfile, sep=sepchar[ftype], header=header)
-        elif ftype in ['xlsx', 'xls']:
-            nodetab = pd.read_excel(ntfile, header=header, 
-              sheet_name=conf['nodetable'].get('sheet', 0))
-        else:
-            raise ValueError('Unknown node table file type: %s' % (ftype))
-        idcolumn = conf['nodetable'].get('idcolumn', nodetab.columns[0])
-        if idcolumn not in nodetab.columns:
-            raise ValueError('Column "%s" not found in node table' % (idcolumn))
         # delete isolated nodes if requested
         if conf['nodetable'].get('skipisolated', False):
-            xtodrop = nodetab.query(idcolumn+' not in @nodesfromedges').index
+            xtodrop = nodetab.index[~nodetab[idcolumn].isin(nodesfromedges)]
             nodetab.drop(xtodrop, inplace=True)
         # check for duplicate node names
         c = Counter(list(nodetab[idcolumn]))
@@ -210,23 +403,30 @@ def table2net(args):
             raise ValueError('Duplicate node names: %s' % (' '.join(map(str, dup))))
         nodetab.index = list(nodetab[idcolumn])
     
-    # convert column names to variable names
+    # remove nodes, and those that have become isolated after edge removal
+    x = nodetab.index[nodetab[idcolumn].isin(removednodes | isolnodes)]
+    nodetab.drop(index=x, inplace=True)
     
-    nodetab.columns = [tovarname(cname) for cname in nodetab.columns]
-    edgetab.columns = [tovarname(cname) for cname in edgetab.columns]
-    idcolumn = tovarname(idcolumn)
+    return (nodetab, edgetab, idcolumn, sourcecolumn, targetcolumn)
 
+def setoutputfiles(conf, args):
+    '''set output file names from config file and command line'''
     # set drawing output file
-    
     if 'outputfiles' not in conf:
         conf['outputfiles'] = {'drawing': 'out.svg'}
-    elif type(conf['outputfiles']) == str:
+    elif type(conf['outputfiles']) in [str, list]:
         conf['outputfiles'] = {'drawing': conf['outputfiles']}
     elif type(conf['outputfiles']) == OrderedDict and 'drawing' not in conf['outputfiles']:
         conf['outputfiles']['drawing'] = 'out.svg'
 
     if args.output: # drawing output file specified on command line
         conf['outputfiles']['drawing'] = args.output
+    # list of drawing files (one for each format), None if no drawing is requested
+    drawout = conf['outputfiles']['drawing']
+    if type(drawout) != list:
+        drawout = [drawout]
+    drawout = [str(f) for f in drawout if f is not None and str(f).lower() != 'none']
+    conf['outputfiles']['drawing'] = drawout or None
 
     # set optional node and edge table output files from command line
     
@@ -235,84 +435,142 @@ def table2net(args):
     if args.edgetableout:
         conf['outputfiles']['edgetableout'] = args.edgetableout
 
-    # remove nodes and edges if requested
-    
-    if 'remove' in conf:
-        # remove nodes
-        if 'nodes' in conf['remove']:
-            x = nodetab.query(conf['remove']['nodes']).index
-            S = set(nodetab.loc[x, idcolumn]) # set of nodes to remove
-            nodetab.drop(index=x, inplace=True) # delete nodes
-            y = edgetab.query(sourcecolumn+' in @S or '+targetcolumn+' in @S').index
-            # delete edges belonging to the deleted nodes
-            edgetab.drop(index=y)
-        # remove edges
-        if 'edges' in conf['remove']: # remove edges
-            x = edgetab.query(conf['remove']['edges']).index
-            # set of nodes connected by the edges to remove
-            S = set(edgetab.loc[x, sourcecolumn]) | set(edgetab.loc[x, targetcolumn])
-            edgetab.drop(index=x, inplace=True) # delete edges
-            # remove nodes that have become isolated after edge removal 
-            # unless keeping them is requested
-            keep = conf['remove'].get('keepisolatednodes', False)
-            if not keep:
-                nonisol = set(edgetab.loc[:, sourcecolumn]) | set(edgetab.loc[:, targetcolumn])
-                becameisol = S-nonisol # became isolated due to the edge removal
-                x = nodetab.query(idcolumn+' in @becameisol').index
-                nodetab.drop(index=x, inplace=True) # delete these
-                
-    # perform network analysis if requested
-    
+def analyze(conf, args, nodetab, edgetab, idcolumn, sourcecolumn, targetcolumn):
+    '''perform network analysis if requested; add new columns to the tables'''
     directed = conf.get('networktype', 'undirected') == 'directed'
     
     if conf.get('networkanalysis', False):
+        quant = conf['networkanalysis']
+        jobs = 1
+        cachesize = nacache.DEFAULTMAXSIZE
+        backend = 'networkx'
+        (samples, seed) = (None, 0)
+        if type(quant) == OrderedDict: # options given
+            jobs = quant.get('jobs', 1)
+            cachesize = quant.get('cachesize', cachesize)
+            backend = quant.get('backend', backend)
+            samples = quant.get('samples', None)
+            seed = quant.get('seed', seed)
+            quant = quant.get('quantities', 'all')
+        if type(jobs) != int or jobs < 1:
+            raise ValueError('networkanalysis/jobs should be a positive integer')
+        if samples is not None and (type(samples) != int or samples < 1):
+            raise ValueError('networkanalysis/samples should be a positive integer')
+        if type(seed) != int or seed < 0:
+            raise ValueError('networkanalysis/seed should be a non-negative integer')
+        if args.jobs: # number of parallel jobs given on command line
+            jobs = args.jobs
+        # results are cached in a directory next to the config file
+        cache = None
+        if cachesize > 0 and not args.no_cache:
+            cache = nacache.AnalysisCache(cachedir(args), maxsize=cachesize)
         # perform network analysis
         (nodeqdic, edgeqdic) = netanalyzer.calcquant(nodetab, idcolumn, edgetab, sourcecolumn, 
-          targetcolumn, directed, quant=conf.get('networkanalysis'))
+          targetcolumn, directed, quant=quant, jobs=jobs, cache=cache, backend=backend,
+          samples=samples, seed=seed)
         # add the new columns to node table and edge table
         for q in nodeqdic:
             nodetab[q] = nodeqdic[q]
         for q in edgeqdic:
             edgetab[q] = edgeqdic[q]
+
+# layouts started from the positions of an earlier layout (startlayout keyword)
+STARTLAYOUTPROGS = ['neato', 'fdp'] # the layout programs using initial positions
+STARTEDGELENGTH = {'neato': 1.0, 'fdp': 0.3} # default edge lengths (inches)
+STARTJITTER = 0.1 # inches, random offset of new nodes from the centroid of their neighbors
+REFINEITERATIONS = 100 # default maxiter of the layout
+
+def startpositions(fname, nodetab, edgetab, idcolumn, sourcecolumn, targetcolumn,
+  edgelength=None):
+    '''initial node positions for a layout started from the one in dot file fname
+
+    Nodes in the earlier layout keep their positions. New nodes are placed at the centroid
+    of their neighbors already placed (repeatedly, so that new nodes connected only to other
+    new nodes are placed too), with a small random offset. If edgelength (inches) is given,
+    the earlier layout is first scaled to this median edge length. Returns (pos, old):
+    Series of Graphviz pos values in inches (None for nodes with no placed neighbor) and of
+    Booleans telling which nodes were in the earlier layout.
+    '''
+    (nodepos, edgepos) = dotlayout.readpositions(fname)
+    known = {}
+    for (v, pos) in nodepos.items():
+        if pos:
+            (x, y) = pos.rstrip('!').split(',')[:2]
+            known[v] = (float(x)/72, float(y)/72) # points to inches
+    if not known:
+        raise ValueError('graph in the start layout file %s has no layout information' % (fname))
+    pos = pd.DataFrame.from_dict(known, orient='index', columns=['x', 'y'])
+    (sources, targets) = (edgetab[sourcecolumn].map(str), edgetab[targetcolumn].map(str))
+    ends = pd.DataFrame({'node': pd.concat([sources, targets], ignore_index=True),
+      'neighbor': pd.concat([targets, sources], ignore_index=True)})
+    ends = ends[ends['node'] != ends['neighbor']]
+    if edgelength:
+        # scale the earlier layout (e.g. expanded by overlap removal) to the edge length
+        # aimed at by the layout program
+        placed = ends[ends['node'].isin(pos.index) & ends['neighbor'].isin(pos.index)]
+        if len(placed):
+            d = pos.loc[placed['node']].values-pos.loc[placed['neighbor']].values
+            median = np.median(np.hypot(d[:, 0], d[:, 1]))
+            if median > 0:
+                pos *= edgelength/median
+    rng = np.random.default_rng(0)
+    while True:
+        new = ends[ends['neighbor'].isin(pos.index) & ~ends['node'].isin(pos.index)]
+        if not len(new):
+            break
+        xy = pos.loc[new['neighbor']].set_axis(new['node'].values)
+        centroid = xy.groupby(level=0).mean()
+        centroid += rng.uniform(-STARTJITTER, STARTJITTER, centroid.shape)
+        pos = pd.concat([pos, centroid])
+    ids = nodetab[idcolumn].map(str)
+    xy = pos.reindex(ids.values).set_axis(nodetab.index)
+    values = ('%.4f,%.4f' % (x, y) if pd.notna(x) else None for (x, y) in zip(xy['x'], xy['y']))
+    return (pd.Series(list(values), index=nodetab.index, dtype=object), ids.isin(list(known)))
+
+def applystyles(conf, nodetab, edgetab, idcolumn, sourcecolumn, targetcolumn):
+    '''define groups and clusters, compute node and edge styles
+
+    Returns the description of the styled graph (see buildgraph) and the colorbars.
+    '''
+    # graphviz attributes of the nodes and edges, collected first and set on the graph
+    # when it is built
+    nodeattrs = pd.DataFrame(index=nodetab.index)
+    edgeattrs = pd.DataFrame(index=edgetab.index)
+    net = {'directed': conf.get('networktype', 'undirected') == 'directed',
+      'graphattrs': OrderedDict(), 'nodedefaults': OrderedDict(), 'edgedefaults': OrderedDict(),
+      'nodeattrs': nodeattrs, 'edgeattrs': edgeattrs, 'clusters': [], 'haslayout': False,
+      'extraattrs': {}}
     
-    # create pygraphviz graph object
-    
-    G = pgv.AGraph(name='network', directed=conf.get('networktype', 'undirected') == 'directed', 
-      strict=False)
-    
-    for nodename in nodetab[idcolumn]:
-        G.add_node(nodename)
-    
-    for x in edgetab.index:
-        G.add_edge(edgetab[sourcecolumn][x], edgetab[targetcolumn][x], key=x)
-    
-    # if input dot is specified, read it and check if nodes/edges are the same as G
+    # if input dot is specified, read it and check if nodes/edges are the same as in the tables
     
     if conf.get('layout', 'neato').lower().endswith('.dot'):
-        L = pgv.AGraph(conf['layout'])
-        Ge = G.edges(keys=True)
-        Le = L.edges(keys=True)
-        Gn = G.nodes()
-        Ln = L.nodes()
-        if (len(Ge), len(Gn), set(Ge), set(Gn)) == (len(Le), len(Ln), set(Le), set(Ln)):
-            if (all('pos' in L.get_node(v).attr for v in L.nodes()) and 
-                all('pos' in L.get_edge(u, v, key=x).attr for (u, v, x) in L.edges(keys=True))):
+        (nodepos, edgepos) = dotlayout.readpositions(conf['layout'])
+        Tn = [str(v) for v in nodetab[idcolumn]]
+        # nodes only in the edge table (added to the graph by buildgraph)
+        endpoints = pd.unique(pd.concat([edgetab[sourcecolumn], edgetab[targetcolumn]],
+          ignore_index=True).astype(str))
+        tablenodes = set(Tn)
+        extranodes = [v for v in endpoints if v not in tablenodes]
+        Te = [(str(u), str(v), str(x)) for (u, v, x) in zip(edgetab[sourcecolumn],
+          edgetab[targetcolumn], edgetab.index)]
+        # (the node names and the edge keys are unique in both)
+        if (len(Tn)+len(extranodes), len(Te)) == (len(nodepos), len(edgepos)) and \
+          nodepos.keys() == set(Tn+extranodes) and edgepos.keys() == set(Te):
+            if None not in nodepos.values() and None not in edgepos.values():
                 # copy all positions
-                for v in Ln:
-                    vG = G.get_node(v)
-                    vL = L.get_node(v)
-                    vG.attr['pos'] = vL.attr['pos']
-                for (u, v, x) in Le:
-                    eG = G.get_edge(u, v, key=x)
-                    eL = L.get_edge(u, v, key=x)
-                    eG.attr['pos'] = eL.attr['pos']
-                G.has_layout = True
+                setattrcol(nodeattrs, 'pos', pd.Series([nodepos[v] for v in Tn],
+                  index=nodetab.index))
+                setattrcol(edgeattrs, 'pos', pd.Series([edgepos[e] for e in Te],
+                  index=edgetab.index))
+                net['extraattrs'] = {v: {'pos': nodepos[v]} for v in extranodes}
+                net['haslayout'] = True
             else:
                 raise ValueError('graph in the input dot file %s has no layout information' %
                                   (conf['layout']))
         else:
             raise ValueError('graph in the input dot file %s differs from the graph specified '
-                             'in the tables' % (conf['layout']))
+                             'in the tables (use startlayout to start a new layout from its '
+                             'positions)' % (conf['layout']))
     elif conf.get('layout', 'neato') not in ['neato', 'dot', 'twopi', 'circo', 'fdp', 'sfdp',
                   'patchwork', 'osage']:
         raise ValueError('layout should be one of neato, dot, twopi, circle, fdp, sfdp, '
@@ -322,12 +580,34 @@ def table2net(args):
     # parse graph attribute definitions
     
     ## by default, use outputorder=edgesfirst, overlap=false
-    G.graph_attr['outputorder'] = 'edgesfirst'
-    G.graph_attr['overlap'] = False
+    net['graphattrs']['outputorder'] = 'edgesfirst'
+    net['graphattrs']['overlap'] = False
+    
+    # start the layout from the positions of an earlier one if requested
+    
+    if conf.get('startlayout'):
+        start = conf['startlayout']
+        if type(start) == str: # short form: file name only
+            start = OrderedDict([('file', start)])
+        if 'file' not in start:
+            raise ValueError('startlayout/file should be given')
+        if conf.get('layout', 'neato') not in STARTLAYOUTPROGS:
+            raise ValueError('startlayout can only be used with the %s layouts' % (
+              ' and '.join(STARTLAYOUTPROGS)))
+        # pinned nodes keep their positions, otherwise the earlier layout is rescaled
+        pin = start.get('pin', False)
+        (pos, old) = startpositions(start['file'], nodetab, edgetab, idcolumn, sourcecolumn,
+          targetcolumn, None if pin else STARTEDGELENGTH[conf.get('layout', 'neato')])
+        print('Starting layout from the positions in %s (%d new nodes)' % (start['file'],
+          (~old).sum()))
+        if pin: # keep the nodes of the earlier layout fixed
+            pos[old] = pos[old]+'!'
+        setattrcol(nodeattrs, 'pos', pos.dropna())
+        net['graphattrs']['maxiter'] = REFINEITERATIONS # only a refinement is needed
     # check validity of graph attribute names
     kwcheck(conf.get('graphattrs', []), gvattrs['G'], name='graph attribute|graph attributes')
     for gattr in conf.get('graphattrs', []):
-        G.graph_attr[gattr] = conf['graphattrs'][gattr]
+        net['graphattrs'][gattr] = conf['graphattrs'][gattr]
     
     # parse node group definitions
     
@@ -338,7 +618,7 @@ def table2net(args):
             if ngname in nodetab.columns:
                 if nodetab[ngname].dtype == bool:
                     # group name matches a Boolean column name, accept it as a group
-                    nodegroups[ngname] = nodetab.query(ngname).index
+                    nodegroups[ngname] = expressions.select(nodetab, ngname, 'nodegroups/'+ngname)
                     continue
                 else:
                     raise ValueError('node group name %s matches existing node table column name' %
@@ -347,16 +627,16 @@ def table2net(args):
             # add boolean column to node table so the group can be used in subsequent
             # group definitions
             if type(groupdef) == str:
-                nodetab[ngname] = nodetab.eval(groupdef, engine='python')
+                nodetab[ngname] = expressions.evaluate(nodetab, groupdef, 'nodegroups/'+ngname)
             elif type(groupdef) == list: # explicit node list given
                 NS = set(groupdef) # node set
                 U = NS-set(nodetab.index)
                 if U: # there are unknown node names
                     raise ValueError('unknown node(s) given in node group definition: '+str(U))
-                nodetab[ngname] = nodetab.eval(idcolumn+' in @NS', engine='python')
+                nodetab[ngname] = nodetab[idcolumn].isin(list(NS))
             else:
                 raise ValueError('group definition must be string or list: '+ngname)
-            nodegroups[ngname] = nodetab.query(ngname, engine='python').index
+            nodegroups[ngname] = expressions.select(nodetab, ngname, 'nodegroups/'+ngname)
                     
     # parse edge group definitions
     
@@ -367,7 +647,7 @@ def table2net(args):
             if egname in edgetab.columns:
                 if edgetab[egname].dtype == bool:
                     # group name matches a Boolean column name, accept it as a group
-                    edgegroups[egname] = edgetab.query(egname).index
+                    edgegroups[egname] = expressions.select(edgetab, egname, 'edgegroups/'+egname)
                     continue
                 else:
                     raise ValueError('edge group name %s matches existing edge table column name' %
@@ -376,7 +656,7 @@ def table2net(args):
             # add boolean column to node table so the group can be used in subsequent
             # group definitions
             if type(groupdef) == str:
-                edgetab[egname] = edgetab.eval(groupdef, engine='python')
+                edgetab[egname] = expressions.evaluate(edgetab, groupdef, 'edgegroups/'+egname)
             elif type(groupdef) == list: # explicit edge list given
                 edges = list(zip(edgetab[sourcecolumn], edgetab[targetcolumn]))
                 ES = set(groupdef)
@@ -384,7 +664,7 @@ def table2net(args):
                 if U: # there are unknown edges given
                     raise ValueError('unknown edges specified in edge group definition: '+str(U))
                 edgetab[egname] = [e in ES for e in edges] # adding Boolean column to edge table
-            edgegroups[egname] = edgetab.query(egname, engine='python').index
+            edgegroups[egname] = expressions.select(edgetab, egname, 'edgegroups/'+egname)
     
     # parse cluster definitions
     
@@ -443,15 +723,13 @@ def table2net(args):
                 parent[clusname] = min(ancestors, key=lambda c: len(clusnodesets[c]))
                 # the parent has clusname as child
                 children[parent[clusname]].append(clusname)
-        # we have the cluster tree; traverse it by DFS from root, and create the subgraphs
-        subgraphs = {'_top': G}
+        # we have the cluster tree; traverse it by DFS from root, so that the subgraphs
+        # can be created in this order
         S = ['_top'] # stack
         while S:
             v = S.pop()
             if v != '_top':
-                P = subgraphs[parent[v]]
-                C = P.add_subgraph(clusnodesets[v], name='cluster_'+v, **clusdefs[v])
-                subgraphs[v] = C
+                net['clusters'].append((v, parent[v], clusnodesets[v], clusdefs[v]))
             S += children[v]
         
     # parse addrankings
@@ -470,8 +748,9 @@ def table2net(args):
             method = tt.get('method', 'average')
             reverse = not tt.get('reverse', False)
             # add new column to table
-            tab[columnname] = tab.loc[withingroup].eval(tt['colexpr']).rank(method=method, 
-              ascending=reverse)
+            col = expressions.evaluate(tab.loc[withingroup], tt['colexpr'],
+              'addrankings/'+columnname)
+            tab[columnname] = col.rank(method=method, ascending=reverse)
     
     # parse custom colormaps
     
@@ -502,6 +781,7 @@ def table2net(args):
         isnodegr = igr < len(conf.get('nodestyles', []))
         isedgegr = not isnodegr
         tab = nodetab if isnodegr else edgetab
+        attrs = nodeattrs if isnodegr else edgeattrs
         if isnodegr and gr not in nodegroups:
             raise ValueError('Undefined node group: '+gr)
         elif isedgegr and gr not in edgegroups:
@@ -518,55 +798,30 @@ def table2net(args):
         # iterate over attributes
         for prop in props:
             propval = props[prop] # attribute value
+            key = gname+'styles/'+gr+'/'+prop # for error messages
             # constant value "mapping"
             if type(propval) != OrderedDict: # constant value for property (=attribute)
                 if gr == 'default': # default value
                     if prop.startswith('ng'): # non-graphviz property
                         tab[prop] = propval
                     elif isnodegr:
-                        G.node_attr[prop] = propval
+                        net['nodedefaults'][prop] = propval
                     else:
-                        G.edge_attr[prop] = propval
-                else: # a non-default group
-                    for x in xlist:
-                        if prop.startswith('ng'): # non-graphviz property
-                            tab.loc[x, prop] = propval
-                        elif isnodegr: # for node table
-                            node = G.get_node(x)
-                            node.attr[prop] = propval
-                        else: # for edge table
-                            edge = G.get_edge(tab.at[x, sourcecolumn], tab.at[x, targetcolumn], 
-                              key=x)
-                            edge.attr[prop] = propval
+                        net['edgedefaults'][prop] = propval
+                    continue
+                values = pd.Series(propval, index=xlist)
             # direct mapping
             elif propval['type'] == 'direct': # direct mapping of table data to style
-                col = tab.eval(propval['colexpr'], engine='python')
-                for x in xlist:
-                    if prop.startswith('ng'): # non-graphviz property
-                        tab.at[x, prop] = col[x]
-                    elif isnodegr: # for node table
-                        node = G.get_node(x)
-                        node.attr[prop] = col[x]
-                    else: # for edge table
-                        edge = G.get_edge(tab.at[x, sourcecolumn], tab.at[x, targetcolumn], key=x)
-                        edge.attr[prop] = col[x]
+                col = expressions.evaluate(tab, propval['colexpr'], key)
+                values = col[xlist]
             # discrete mapping
             elif propval['type'] == 'discrete': # discrete mapping
-                col = tab.eval(propval['colexpr'], engine='python')
-                for x in xlist:
-                    if col[x] not in propval['map']:
-                        continue
-                    if prop.startswith('ng'): # non-graphviz property
-                        tab.at[x, prop] = propval['map'][col[x]]
-                    elif isnodegr: # for node table
-                        node = G.get_node(x)
-                        node.attr[prop] = propval['map'][col[x]]
-                    else: # for edge table
-                        edge = G.get_edge(tab.at[x, sourcecolumn], tab.at[x, targetcolumn], key=x)
-                        edge.attr[prop] = propval['map'][col[x]]
+                col = expressions.evaluate(tab, propval['colexpr'], key)[xlist]
+                col = col[col.isin(list(propval['map']))] # unmapped values are left alone
+                values = col.map(propval['map'])
             # linear mapping
             elif propval['type'] == 'linear': # linear mapping
-                col = tab.eval(propval['colexpr'], engine='python')
+                col = expressions.evaluate(tab, propval['colexpr'], key)
                 if propval.get('withingroup', False):
                     minval = col[xlist].dropna().min()
                     maxval = col[xlist].dropna().max()
@@ -579,36 +834,19 @@ def table2net(args):
                 mapmax = propval['mapmax']
                 factor = (mapmax-mapmin)/(maxval-minval)
                 col = mapmin+factor*(col-minval)
-                for x in xlist:
-                    if prop.startswith('ng'): # non-graphviz property
-                        tab.at[x, prop] = col[x]
-                    elif isnodegr:
-                        node = G.get_node(x)
-                        node.attr[prop] = col[x]
-                    else:
-                        edge = G.get_edge(tab.at[x, sourcecolumn], tab.at[x, targetcolumn], key=x)
-                        edge.attr[prop] = col[x]
+                values = col[xlist]
             # cont2disc mapping
             elif propval['type'] == 'cont2disc': # continuous-to-discrete mapping
-                col = tab.eval(propval['colexpr'], engine='python')
+                col = expressions.evaluate(tab, propval['colexpr'], key)
                 L = list(propval['map'])
                 if L[-1] != 'higher':
                     raise ValueError('last value in cont2disc map must be "higher"')
                 if sorted(L[:-1]) != L[:-1]:
                     raise ValueError('values in cont2disc map must be in ascending order')
-                for x in xlist:
-                    mappedval = cont2disc(col[x], propval['map'])
-                    if prop.startswith('ng'): # non-graphviz property
-                        tab.at[x, prop] = mappedval
-                    elif isnodegr:
-                        node = G.get_node(x)
-                        node.attr[prop] = mappedval
-                    else:
-                        edge = G.get_edge(tab.at[x, sourcecolumn], tab.at[x, targetcolumn], key=x)
-                        edge.attr[prop] = mappedval
+                values = cont2disc(col[xlist], propval['map'])
             # colormap mapping
             elif propval['type'] == 'colormap': # color mapping
-                col = tab.eval(propval['colexpr'], engine='python').copy()
+                col = expressions.evaluate(tab, propval['colexpr'], key).copy()
                 if 'colormaps' in conf and propval['colormap'] in conf['colormaps']:
                     cmap = conf['colormaps'][propval['colormap']]['colormap']
                 else:
@@ -673,45 +911,133 @@ def table2net(args):
                           reverse=rev)
                 if rev:
                     col = 1.0-col
-                for x in xlist:
-                    if prop.startswith('ng'): # non-graphviz property
-                        tab.at[x, prop] = colors.to_hex(cmap(col[x]), keep_alpha=True)
-                    elif isnodegr:
-                        node = G.get_node(x)
-                        node.attr[prop] = colors.to_hex(cmap(col[x]), keep_alpha=True)
-                    else:
-                        edge = G.get_edge(tab.at[x, sourcecolumn], tab.at[x, targetcolumn], key=x)
-                        edge.attr[prop] = colors.to_hex(cmap(col[x]), keep_alpha=True)
+                rgba = cmap(np.asarray(col[xlist], dtype=float))
+                values = pd.Series(tohex(rgba), index=xlist, dtype=object)
             # combine mapping
             elif propval['type'] == 'combine':
-                for x in xlist:
-                    t = tuple([tab.at[x, p] for p in propval['attrlist']])
-                    s = propval['formatstring'] % t
-                    if prop.startswith('ng'): # non-graphviz property
-                        tab.at[x, prop] = s
-                    elif isnodegr:
-                        node = G.get_node(x)
-                        node.attr[prop] = s
-                    else:
-                        edge = G.get_edge(tab.at[x, sourcecolumn], tab.at[x, targetcolumn], key=x)
-                        edge.attr[prop] = s
+                fmt = propval['formatstring']
+                rows = tab.loc[xlist, propval['attrlist']].itertuples(index=False, name=None)
+                values = pd.Series([fmt % t for t in rows], index=xlist)
             # unknown mapping type
             else:
                 raise ValueError('Unknown property mapping type: %s' % (propval['type']))
+            if len(values) == 0:
+                continue
+            if prop.startswith('ng'): # non-graphviz property, stored in the table
+                tab.loc[values.index, prop] = values
+            else:
+                setattrcol(attrs, prop, values)
     
-    # output dot; draw the graph
-    
-    layout = conf.get('layout', 'neato')
-    if not layout.lower().endswith('.dot'):
+    return (net, cbs)
+
+def buildgraph(net, edgetab, sourcecolumn, targetcolumn):
+    '''create the pygraphviz graph from the graph description made by applystyles'''
+    G = pgv.AGraph(name='network', directed=net['directed'], strict=False)
+    for gattr in net['graphattrs']:
+        G.graph_attr[gattr] = net['graphattrs'][gattr]
+    # default attributes first, so that they apply to all nodes and edges added below
+    for prop in net['nodedefaults']:
+        G.node_attr[prop] = net['nodedefaults'][prop]
+    for prop in net['edgedefaults']:
+        G.edge_attr[prop] = net['edgedefaults'][prop]
+    for (x, attrs) in zip(net['nodeattrs'].index, elementattrs(net['nodeattrs'])):
+        G.add_node(x, **attrs)
+    for (u, v, x, attrs) in zip(edgetab[sourcecolumn], edgetab[targetcolumn], edgetab.index,
+      elementattrs(net['edgeattrs'])):
+        G.add_edge(u, v, key=x, **attrs)
+    # layout attributes of the nodes only in the edge table
+    for (x, attrs) in net['extraattrs'].items():
+        G.get_node(x).attr.update(attrs)
+    subgraphs = {'_top': G}
+    for (clusname, parent, nodes, clusattrs) in net['clusters']:
+        P = subgraphs[parent]
+        subgraphs[clusname] = P.add_subgraph(nodes, name='cluster_'+clusname, **clusattrs)
+    G.has_layout = net['haslayout']
+    return G
+
+def getlayout(G, net, edgetab, sourcecolumn, targetcolumn):
+    '''layout attributes (positions and computed sizes, see layoutcache) of the nodes,
+    edges, graph and clusters of laid out graph G, as a dict of dicts of lists (nodes and
+    edges in table order) and dicts'''
+    def getattrs(elem, names):
+        return {a: elem.attr.get(a) or None for a in names}
+    nodenames = [a for a in layoutcache.NODELAYOUTATTRS if a in G.node_attr]
+    edgenames = [a for a in layoutcache.EDGELAYOUTATTRS if a in G.edge_attr]
+    nodes = [getattrs(G.get_node(x), nodenames) for x in net['nodeattrs'].index]
+    edges = [getattrs(G.get_edge(u, v, key=x), edgenames)
+      for (u, v, x) in zip(edgetab[sourcecolumn], edgetab[targetcolumn], edgetab.index)]
+    nodeattrs = {a: [attrs[a] for attrs in nodes] for a in nodenames}
+    edgeattrs = {a: [attrs[a] for attrs in edges] for a in edgenames}
+    # nodes only in the edge table
+    tablenodes = set(str(x) for x in net['nodeattrs'].index)
+    extraattrs = {x: getattrs(G.get_node(x), nodenames) for x in G.nodes()
+      if x not in tablenodes}
+    # bounding boxes, label positions and sizes of the graph and the clusters
+    graphattrs = {a: G.graph_attr.get(a) or None for a in layoutcache.GRAPHLAYOUTATTRS}
+    clusattrs = {c: {a: G.get_subgraph('cluster_'+c).graph_attr.get(a) or None
+      for a in layoutcache.GRAPHLAYOUTATTRS} for (c, parent, nodes, attrs) in net['clusters']}
+    return {'nodeattrs': nodeattrs, 'edgeattrs': edgeattrs, 'extraattrs': extraattrs,
+      'graphattrs': graphattrs, 'clusattrs': clusattrs}
+
+def injectlayout(net, layout):
+    '''put the layout attributes of a layout (from getlayout) into the graph description
+    net, replacing those set by styles (e.g. start positions, in inches instead of points)'''
+    for (attrs, layoutattrs) in [(net['nodeattrs'], layout['nodeattrs']),
+      (net['edgeattrs'], layout['edgeattrs'])]:
+        for (a, values) in layoutattrs.items():
+            values = pd.Series(values, index=attrs.index, dtype=object)
+            if a in attrs:
+                values = values.where(values.notna(), attrs[a])
+            attrs[a] = values
+    net['extraattrs'] = {x: {a: v for (a, v) in attrs.items() if v}
+      for (x, attrs) in layout['extraattrs'].items()}
+    for (attrs, layoutattrs) in [(net['graphattrs'], layout['graphattrs'])]+[(clusattrs,
+      layout['clusattrs'].get(c, {})) for (c, parent, nodes, clusattrs) in net['clusters']]:
+        for (a, v) in layoutattrs.items():
+            if v:
+                attrs[a] = v
+    net['haslayout'] = True
+
+def layoutgraph(conf, G):
+    '''lay out the graph unless it already has one (from a dot file or the layout cache)'''
+    if not G.has_layout:
         print('Laying out graph...') # may take some time
-        G.layout(prog=layout)
-    
+        G.layout(prog=conf.get('layout', 'neato'))
+
+def renderdrawings(G, fnames):
+    '''render laid out graph G into several drawing files at the same time, in separate
+    Graphviz processes; the formats are given by the file name extensions'''
+    prog = shutil.which('neato')
+    if prog is None: # Graphviz programs not on the path, render one by one
+        for fname in fnames:
+            G.draw(fname)
+        return
+    dot = G.string().encode(G.encoding)
+    def render(fname):
+        fmt = os.path.splitext(fname)[1].lower()[1:] or 'dot'
+        # neato -n2 uses the positions in the graph as they are
+        return subprocess.run([prog, '-n2', '-T'+fmt, '-o', fname], input=dot,
+          capture_output=True)
+    with ThreadPoolExecutor(max_workers=len(fnames)) as pool:
+        results = list(pool.map(render, fnames))
+    for (fname, result) in zip(fnames, results):
+        sys.stderr.write(result.stderr.decode(G.encoding, errors='replace')) # warnings
+        if result.returncode != 0:
+            raise ValueError('Graphviz could not render the drawing %s' % (fname))
+
+def writeoutputs(conf, args, G, nodetab, edgetab, cbs):
+    '''draw the graph and write the requested output files'''
     outputfiles = conf['outputfiles']
     drawout = outputfiles['drawing']
     print('Writing output files...')
-    # write drawing
-    G.draw(drawout)
-    print('Drawing written to', drawout)
+    # write drawings
+    if drawout:
+        if len(drawout) == 1:
+            G.draw(drawout[0])
+        else:
+            renderdrawings(G, drawout)
+        for fname in drawout:
+            print('Drawing written to', fname)
     # write dot file if requested
     if 'dot' in outputfiles:
         G.write(outputfiles['dot']) # write dot file
@@ -719,31 +1045,289 @@ def table2net(args):
     # write node table if requested
     if 'nodetableout' in outputfiles:
         fname = outputfiles['nodetableout']
-        if 'nodetable' in conf and ntfile == fname:
+        if fname == tablefile(conf, args, 'nodetable'):
             raise ValueError('Cannot overwrite node table file')
-        sep = sepchar.get(fname.lower()[-3:], False)
-        if sep:
-            nodetab.to_csv(fname, sep=sep, index=False)
-        elif fname.lower().endswith('xls') or fname.lower().endswith('xlsx'):
-            nodetab.to_excel(fname, index=False)
+        tableio.writetable(nodetab, fname)
         print('Modified node table written to', fname)
     # write edge table if requested
     if 'edgetableout' in outputfiles:
         fname = outputfiles['edgetableout']
-        if etfile == fname:
+        if fname == tablefile(conf, args, 'edgetable'):
             raise ValueError('Cannot overwrite edge table file')
-        sep = sepchar.get(fname.lower()[-3:], False)
-        if sep:
-            edgetab.to_csv(fname, sep=sep, index=False)
-        elif fname.lower().endswith('xls') or fname.lower().endswith('xlsx'):
-            edgetab.to_excel(fname, index=False)
+        tableio.writetable(edgetab, fname)
         print('Modified edge table written to', fname)
     # write colorbars if requested
     if cbs:
         fname = conf['outputfiles']['colorbars']
         cbs.writesvg(fname)
         print('Colorbars written into', fname)
-            
+
+# config keywords affecting each processing stage
+stagekw = OrderedDict([
+  ('tables', ['edgetable', 'nodetable', 'remove']),
+  ('analysis', ['networkanalysis', 'networktype']),
+  ('styles', ['title', 'layout', 'startlayout', 'graphattrs', 'nodegroups', 'edgegroups',
+    'clusters', 'addrankings', 'colormaps', 'nodestyles', 'edgestyles']),
+  ('layout', ['layout', 'startlayout', 'graphattrs', 'clusters', 'nodegroups', 'networktype'])])
+
+class Session():
+    '''create the visualization in stages, keeping the results between runs
+
+    With incremental=True (watch mode), the tables, analysis results, styled graph
+    and layout are kept in memory, and a rerun repeats only the stages affected by
+    the changes in the config file (and the input files): e.g. after a style-only
+    change, the graph is restyled and drawn with the previous layout.
+    '''
+    def __init__(self, args, incremental=False):
+        self.args = args
+        self.incremental = incremental
+        self.done = {} # config values of the stages completed in the previous run
+        self.inputfiles = [args.configfile]
+        self.layoutkey = None # layout-affecting part of the styled graph (see layoutcache)
+    def run(self):
+        '''(re)create the visualization'''
+        args = self.args
+        conf = parseconfig(args.configfile)
+        checkkeywords(conf) # do some input validation
+        # config values for each stage, to compare with those of the previous run
+        kw = copy.deepcopy(OrderedDict((stage, [conf.get(k) for k in stagekw[stage]])
+          for stage in stagekw))
+        kw['tables'] += [tablefile(conf, args, t) for t in ['edgetable', 'nodetable']]
+        kw['tables'] += [mtime(tablefile(conf, args, t)) for t in ['edgetable', 'nodetable']]
+        if str(conf.get('layout', '')).lower().endswith('.dot'):
+            kw['styles'].append(mtime(conf['layout'])) # input layout file
+        start = conf.get('startlayout')
+        startfile = start.get('file') if isinstance(start, dict) else start
+        if startfile and type(startfile) == str: # layout file to start from
+            kw['styles'].append(mtime(startfile))
+            kw['layout'].append(mtime(startfile))
+        setoutputfiles(conf, args)
+        kw['styles'].append('colorbars' in conf['outputfiles'])
+        # the tables are reloaded (but the layout is kept) if other columns are needed
+        kw['columns'] = usedcolumns(conf)
+        # the graphviz graph is only needed for the drawing and the dot file
+        drawgraph = bool(conf['outputfiles']['drawing']) or 'dot' in conf['outputfiles']
+        kw['styles'].append(drawgraph)
+        kw['layout'].append(drawgraph)
+        # files to watch for changes (not those overwritten by the output)
+        infiles = [args.configfile]+[tablefile(conf, args, t) for t in ['edgetable', 'nodetable']]
+        if str(conf.get('layout', '')).lower().endswith('.dot'):
+            infiles.append(conf['layout'])
+        if startfile and type(startfile) == str:
+            infiles.append(startfile)
+        outfiles = [f for v in conf['outputfiles'].values() for f in
+          (v if type(v) == list else [v])]
+        self.inputfiles = [f for f in infiles if f and f not in outfiles]
+        
+        done = self.done
+        self.done = {} # filled in as the stages complete
+        rerun = not self.incremental
+        # load tables
+        if rerun or kw['tables'] != done.get('tables') or kw['columns'] != done.get('columns'):
+            self.tables = loadtables(conf, args)
+            rerun = True
+        self.done['tables'] = kw['tables']
+        self.done['columns'] = kw['columns']
+        # network analysis
+        if rerun or kw['analysis'] != done.get('analysis'):
+            tables = self.tables
+            if self.incremental: # keep loaded tables for reruns
+                tables = (tables[0].copy(), tables[1].copy())+tables[2:]
+            analyze(conf, args, *tables)
+            self.analyzed = tables
+            rerun = True
+        self.done['analysis'] = kw['analysis']
+        # layouts are cached in a directory next to the config file
+        cachesize = conf.get('layoutcache', layoutcache.DEFAULTMAXSIZE)
+        if type(cachesize) not in [int, float] or cachesize < 0:
+            raise ValueError('layoutcache should be a non-negative number (megabytes)')
+        cache = None
+        if drawgraph and cachesize > 0 and not args.no_cache:
+            cache = layoutcache.LayoutCache(cachedir(args), maxsize=cachesize)
+        # create graph and apply styles
+        relayout = kw['tables'] != done.get('tables') or kw['layout'] != done.get('layout')
+        if rerun or kw['styles'] != done.get('styles'):
+            tables = self.analyzed
+            if self.incremental: # keep analyzed tables for reruns
+                tables = (tables[0].copy(), tables[1].copy())+tables[2:]
+            (self.net, self.cbs) = applystyles(conf, *tables)
+            self.styled = tables
+            self.G = None
+            if drawgraph:
+                # styles changing layout-affecting attributes (node sizes, labels, edge
+                # lengths etc.) need a new layout, just like the layout settings
+                if self.incremental or cache:
+                    layoutkey = layoutcache.layoutkey(self.net, conf.get('layout', 'neato'),
+                      tables[1][tables[3]], tables[1][tables[4]])
+                    relayout = relayout or layoutkey != self.layoutkey
+                    self.layoutkey = layoutkey
+                if self.incremental and not relayout:
+                    print('Using layout from previous run')
+                    # (made with the same positions set by styles, e.g. by startlayout)
+                    injectlayout(self.net, self.layout)
+                elif cache and not self.net['haslayout']:
+                    layout = cache.get(self.layoutkey)
+                    if layout:
+                        print('Using cached layout')
+                        # the layout was made with the same positions set by styles
+                        injectlayout(self.net, layout)
+                        self.layout = layout
+                self.G = buildgraph(self.net, tables[1], tables[3], tables[4])
+        self.done['styles'] = kw['styles']
+        # layout
+        if drawgraph and (not self.incremental or relayout):
+            laidout = not self.G.has_layout
+            layoutgraph(conf, self.G)
+            if self.incremental or (cache and laidout):
+                (edgetab, sourcecolumn, targetcolumn) = (self.styled[1],)+self.styled[3:]
+                self.layout = getlayout(self.G, self.net, edgetab, sourcecolumn, targetcolumn)
+            if cache and laidout:
+                cache.put(self.layoutkey, self.layout)
+        self.done['layout'] = kw['layout']
+        # output
+        writeoutputs(conf, args, self.G, self.styled[0], self.styled[1], self.cbs)
+def table2net(args):
+    '''create visualization'''
+    Session(args).run()
+
+## Batch mode
+
+def batchrun(configfile, options):
+    '''create the visualization of one config file in batch mode
+
+    options: the batch command line arguments. Returns (error, output, seconds); error is
+    None on success, output is what was printed.
+    '''
+    args = argparse.Namespace(configfile=configfile, nodetable=None, edgetable=None,
+      output=None, nodetableout=None, edgetableout=None, jobs=None, watch=False,
+      csvengine=options.csvengine, no_cache=options.no_cache)
+    start = time.perf_counter()
+    error = None
+    # the output is collected in a file, including that of Graphviz (written to the file
+    # descriptors directly), and printed by the main process
+    with tempfile.TemporaryFile() as out:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved = [os.dup(1), os.dup(2)]
+        os.dup2(out.fileno(), 1)
+        os.dup2(out.fileno(), 2)
+        try:
+            table2net(args)
+        except (Exception, SystemExit) as e:
+            error = '%s: %s' % (type(e).__name__, str(e).strip().split('\n')[0])
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            for fd in saved:
+                os.close(fd)
+        out.seek(0)
+        output = out.read().decode(errors='replace')
+    return (error, output, time.perf_counter()-start)
+
+def sharedtables(configfiles, options):
+    '''read the table files used by more than one of the config files into tablememo'''
+    users = OrderedDict() # table file -> (tabconf, used columns, keys, config file) list
+    for configfile in configfiles:
+        try:
+            conf = parseconfig(configfile)
+            settablefiles(conf, argparse.Namespace(nodetable=None, edgetable=None))
+            used = usedcolumns(conf)
+        except Exception: # reported when the config file is run
+            continue
+        for (table, keys) in [('edgetable', ['sourcecolumn', 'targetcolumn']),
+          ('nodetable', ['idcolumn'])]:
+            tabconf = conf.get(table)
+            if not isinstance(tabconf, dict) or 'file' not in tabconf or tabconf.get('chunksize'):
+                continue
+            users.setdefault(os.path.abspath(tabconf['file']), []).append((tabconf,
+              used[table], keys, configfile))
+    for (fname, tabusers) in users.items():
+        if len(set(u[3] for u in tabusers)) < 2:
+            continue
+        (tabconf, used, keys, configfile) = tabusers[0]
+        cache = None if options.no_cache else tableio.DtypeCache(cachedir(
+          argparse.Namespace(configfile=configfile)))
+        try:
+            readtablefile(tabconf, used, keys, options.csvengine, cache, memo=True)
+        except Exception:
+            pass
+
+def sharedoutputs(configfiles):
+    '''warn about output files written by more than one of the config files'''
+    writers = OrderedDict() # output file -> config files
+    for configfile in configfiles:
+        try:
+            outputfiles = parseconfig(configfile).get('outputfiles')
+        except Exception:
+            continue
+        if type(outputfiles) == str: # only the drawing
+            outputfiles = {'drawing': outputfiles}
+        if not isinstance(outputfiles, dict):
+            continue
+        for v in outputfiles.values():
+            for f in (v if type(v) == list else [v]):
+                if type(f) == str:
+                    writers.setdefault(os.path.abspath(f), []).append(configfile)
+    for (f, configs) in writers.items():
+        if len(configs) > 1:
+            print('Warning: %s is written by several config files (%s), the result depends on '
+              'which finishes last' % (os.path.relpath(f), ', '.join(configs)))
+
+def batchmain(argv=None):
+    '''create the visualizations of many config files using a pool of worker processes
+    (the tabnetviz-batch command; argv: command line arguments, default: sys.argv[1:])'''
+    global tablememo
+    parser = argparse.ArgumentParser(prog='tabnetviz-batch',
+      description='Create the visualizations of several config files in parallel')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+      help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--csvengine', choices=tableio.csvengines,
+      help='parser for csv/tsv tables (pyarrow: multithreaded, fastest)')
+    parser.add_argument('--no-cache', action='store_true',
+      help='do not use cached layouts, network analysis results and table column types')
+    parser.add_argument('configfiles', nargs='+',
+      help='Configuration files (wildcards like *.yaml are expanded)')
+    a = parser.parse_args(argv)
+    configfiles = []
+    for pattern in a.configfiles:
+        configfiles += sorted(glob.glob(pattern)) or [pattern] # missing files are reported
+    configfiles = list(OrderedDict.fromkeys(configfiles))
+    sharedoutputs(configfiles)
+    # the tables shared by several config files are read once, before the worker processes
+    # are forked (they get a copy of the tables, and of the modules already imported)
+    tablememo = {}
+    sharedtables(configfiles, a)
+    context = None
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    results = {}
+    with ProcessPoolExecutor(max_workers=max(1, a.jobs), mp_context=context) as pool:
+        futures = {pool.submit(batchrun, f, a): f for f in configfiles}
+        for future in as_completed(futures):
+            f = futures[future]
+            try:
+                results[f] = future.result()
+            except Exception as e: # e.g. a worker process was killed
+                results[f] = ('%s: %s' % (type(e).__name__, e), '', 0)
+            (error, output, seconds) = results[f]
+            print('==> %s <==' % (f))
+            print(output, end='')
+            if error:
+                print(error)
+            sys.stdout.flush()
+    # summary
+    print('Summary:')
+    width = max(len(f) for f in configfiles)
+    for f in configfiles:
+        (error, output, seconds) = results[f]
+        print('  %-*s  %s' % (width, f, 'FAILED (%s)' % (error) if error else
+          'OK (%.1f s)' % (seconds)))
+    failed = sum(1 for f in configfiles if results[f][0])
+    print('%d of %d config files done, %d failed' % (len(configfiles)-failed, len(configfiles),
+      failed))
+    sys.exit(1 if failed else 0)
 
 ## Main program
 
@@ -751,14 +1335,21 @@ def main():
     # parse arguments
     epi = 'Tabnetviz v'+__version__+'. See https://git.io/tabnetviz for documentation.'
     epi += ' Copyright 2019 Andras Szilagyi. Distributed under GNU GPL version 3.'
+    epi += ' Use tabnetviz-batch for processing many config files at once.'
     parser = argparse.ArgumentParser(description='Table-based network visualizer', epilog=epi)
     parser.add_argument('-w', '--watch', action='store_true', 
-      help='Watch the config file and re-run upon detecting a change')
+      help='Watch the config file and input files and re-run upon detecting a change')
     parser.add_argument('-n', '--nodetable', help='node table file name')
     parser.add_argument('-e', '--edgetable', help='edge table file name')
     parser.add_argument('-o', '--output', help='output file for the drawing')
     parser.add_argument('--nodetableout', help='file name for writing modified node table')
     parser.add_argument('--edgetableout', help='file name for writing modified edge table')
+    parser.add_argument('-j', '--jobs', type=int, 
+      help='number of parallel processes for network analysis')
+    parser.add_argument('--csvengine', choices=tableio.csvengines,
+      help='parser for csv/tsv tables (pyarrow: multithreaded, fastest)')
+    parser.add_argument('--no-cache', action='store_true',
+      help='do not use cached layouts, network analysis results and table column types')
     parser.add_argument('--configtemplate', action='store_true',
       help='Write a configuration template to the specified file and exit')
     parser.add_argument('configfile', help='Configuration file')
@@ -777,22 +1368,24 @@ def main():
         sys.exit()
     
     # create visualization
-    table2net(a)
+    # in watch mode, keep intermediate results so reruns only redo what is needed
+    session = Session(a, incremental=a.watch)
+    session.run()
     
     # watch if -w is given
     if a.watch:
-        print('Watching config file (%s) for changes, press Ctrl-C to quit...' % (a.configfile))
-        mtime = os.stat(a.configfile).st_mtime
+        watcher = filewatch.watcher(session.inputfiles)
+        print('Watching input files (%s) for changes, press Ctrl-C to quit...' % (
+          ', '.join(session.inputfiles)))
         while True:
-            sleep(0.5)
-            mt = os.stat(a.configfile).st_mtime
-            if mt != mtime:
-                print('Re-running...')
-                try:
-                    table2net(a.configfile)
-                except ValueError as e:
-                    print('ValueError:', e)
-                mtime = mt
+            changed = watcher.wait()
+            print('Change detected in', ', '.join(sorted(changed)))
+            print('Re-running...')
+            try:
+                session.run()
+            except ValueError as e:
+                print('ValueError:', e)
+            watcher.setfiles(session.inputfiles)
 
 if __name__ == '__main__':
     main()
@@ -15,29 +15,34 @@ networktype: directed      # directed | undirected
 #
 #edgetable: edges.csv      # short form if you don't provide any other parameters
 edgetable:
-  file: edges.xlsx         # .csv, .tsv, .xlsx/.xls
-  filetype: xlsx           # csv|tsv|xlsx|xls (optional)
+  file: edges.xlsx         # .csv, .tsv, .xlsx/.xls, .parquet, .feather, .arrow
+  filetype: xlsx           # csv|tsv|xlsx|xls|parquet|feather|arrow (optional)
   sheet: Sheet1            # only for .xlsx/.xls, first sheet is used if omitted
   noheader: false          # true if table has no header line (col1, col2,... will be used)
+  csvengine: c             # csv/tsv parser: c, python or pyarrow (multithreaded, fastest)
+  categorical: false       # true: text columns with few distinct values are categorical
   sourcecolumn: source     # name of source column (first column by default)
   targetcolumn: target     # name of target column (second column by default)
   fromcytoscape: no        # set to yes if exported from Cytoscape
+  chunksize: 1000000       # read in chunks, dropping removed edges on the fly (optional)
 #
 # Define node table
 #
 #nodetable: nodes.csv      # short form if you don't provide any other parameters
 nodetable:                 # optional; nodes will be inferred from edge table if omitted
-  file: example.xlsx       # .csv, .tsv, .xlsx/.xls
-  filetype: xlsx           # csv|tsv|xlsx|xls (optional)
+  file: example.xlsx       # .csv, .tsv, .xlsx/.xls, .parquet, .feather, .arrow
+  filetype: xlsx           # csv|tsv|xlsx|xls|parquet|feather|arrow (optional)
   sheet: Sheet1            # only for .xlsx/.xls, first sheet is used if omitted
   noheader: false          # true if table has no header line (col1, col2, ... will be used)
+  csvengine: c             # csv/tsv parser: c, python or pyarrow (multithreaded, fastest)
+  categorical: false       # true: text columns with few distinct values are categorical
   idcolumn: name           # name of node id column (first column by default)
   skipisolated: false      # set to true to skip isolated nodes
 #
 # Output files
 #
 outputfiles:
-  drawing: file.svg         # for the drawing
+  drawing: file.svg         # for the drawing (none: no drawing; list: several formats)
   dot: dotfile.dot          # optional, for dot file containing positions after layout
   nodetableout: nodeout.csv # optional, for modified node table
   edgetableout: edgeout.csv # optional, for modified edge table
@@ -46,6 +51,8 @@ outputfiles:
 # Define layout
 #
 layout: neato              # neato|dot|twopi|circo|fdp|sfdp|patchwork|osage (see graphviz docs)
+#startlayout: old.dot      # start neato/fdp layout from positions in earlier dot file
+#layoutcache: 200          # size limit of layout cache in megabytes (0: no cache)
 #
 # Graph attributes (note: "outputorder: edgesfirst" and "overlap: false" are set by default)
 #
@@ -56,6 +63,13 @@ graphattrs:
 # Perform network analysis
 #
 networkanalysis: false     # set to 'all' or list of quantity names, see documentation
+#networkanalysis:          # alternative form with options
+#  quantities: all         # 'all' or list of quantity names
+#  jobs: 1                 # number of parallel processes
+#  cachesize: 200          # size limit of result cache in megabytes (0: no cache)
+#  backend: networkx       # networkx, igraph or csgraph (faster, if installed)
+#  samples: 500            # approximate path based quantities from this many source nodes
+#  seed: 0                 # random seed for the approximation
 #
 # Define node groups
 #
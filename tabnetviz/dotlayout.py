@@ -0,0 +1,114 @@
+'''reading node and edge positions from dot (or xdot) layout files for tabnetviz'''
+
+# Copyright 2019 Andras Szilagyi
+# Distributed under the GNU General Public License v3
+# See https://www.gnu.org/licenses/gpl-3.0.html
+#
+# The positions are parsed from the file text in one pass with regular expressions, which
+# is much faster for large graphs than reading the file with pygraphviz and querying the
+# attributes one element at a time. Files with constructs not handled here (HTML strings,
+# strict graphs, pos as a default attribute, subgraphs in edge statements) are read with
+# pygraphviz.
+
+import re
+
+import pygraphviz as pgv
+
+# DOT grammar elements
+# (with loops unrolled, which makes the matching of long strings fast)
+SPACE = r'\s*(?:(?://[^\n]*|/\*.*?\*/|(?m:^\#[^\n]*))\s*)*' # including comments
+STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+ID = r'(?:%s(?:\s*\+\s*%s)*|[^\W\d]\w*|-?(?:\.\d+|\d+(?:\.\d*)?))' % (STRING, STRING)
+NODEREF = r'%s(?:\s*:\s*%s){0,2}' % (ID, ID) # node id with port and compass point
+ATTRLISTS = r'(?:\s*\[[^\]"<]*(?:%s[^\]"<]*)*\])*' % (STRING)
+
+header = re.compile(r'%s(?i:(strict)\s+)?(?i:(di)?graph)\b\s*(?:%s)?\s*\{%s' % (SPACE, ID,
+  SPACE), re.S)
+# statements (in the order tried), each followed by whitespace and an optional semicolon
+statement = re.compile(r'''(?:
+  (?P<close>\})
+ |(?P<open>(?i:subgraph)\b(?:\s*%(ID)s)?\s*\{|\{)
+ |(?P<kind>(?i:graph|node|edge))\b\s*(?P<defaults>%(ATTRLISTS)s)
+ |%(ID)s\s*=\s*%(ID)s
+ |(?P<edge>%(NODEREF)s(?:\s*(?:--|->)\s*%(NODEREF)s)+)\s*(?P<edgeattrs>%(ATTRLISTS)s)
+ |(?P<node>%(ID)s)(?:\s*:\s*%(ID)s){0,2}\s*(?P<nodeattrs>%(ATTRLISTS)s)
+ )%(SPACE)s;?%(SPACE)s''' % {'ID': ID, 'NODEREF': NODEREF, 'ATTRLISTS': ATTRLISTS,
+  'SPACE': SPACE}, re.S | re.X)
+noderef = re.compile(r'(%s)(?:\s*:\s*%s){0,2}' % (ID, ID), re.S)
+attribute = re.compile(r'(%s)\s*=\s*(%s)' % (ID, ID), re.S)
+stringpart = re.compile(STRING, re.S)
+
+def unquote(s):
+    '''the value of a DOT id'''
+    if not s.startswith('"'):
+        return s
+    s = ''.join(part[1:-1] for part in stringpart.findall(s)) # concatenated with +
+    return s.replace('\\"', '"').replace('\\\r\n', '').replace('\\\n', '')
+
+def attributes(attrlists, names=('pos', 'key')):
+    '''dict of the values of those attributes in names that are set in the attribute lists
+    of a statement'''
+    found = {}
+    for (a, v) in attribute.findall(attrlists):
+        if a[0] == '"':
+            a = unquote(a)
+        if a in names:
+            found[a] = unquote(v)
+    return found
+
+def parsepositions(text):
+    '''node and edge positions in DOT text (see readpositions), or None if the text
+    contains constructs not handled here'''
+    m = header.match(text)
+    if not m or m.group(1):
+        return None
+    (nodepos, edgepos) = ({}, {})
+    (i, depth) = (m.end(), 1)
+    match = statement.match
+    while depth > 0:
+        m = match(text, i)
+        if not m or m.end() == i:
+            return None
+        i = m.end()
+        if m.group('close'):
+            depth -= 1
+        elif m.group('open'):
+            depth += 1
+        elif m.group('kind'):
+            if m.group('kind').lower() != 'graph' and 'pos' in attributes(m.group('defaults')):
+                return None # pos as a default attribute
+        elif m.group('edge'):
+            attrs = attributes(m.group('edgeattrs'))
+            nodes = [unquote(x) for x in noderef.findall(m.group('edge'))]
+            for (u, v) in zip(nodes[:-1], nodes[1:]):
+                for x in [u, v]:
+                    nodepos.setdefault(x, None)
+                e = (u, v, attrs.get('key'))
+                if attrs.get('pos') or e not in edgepos:
+                    edgepos[e] = attrs.get('pos') or None
+        elif m.group('node'):
+            x = unquote(m.group('node'))
+            pos = attributes(m.group('nodeattrs')).get('pos')
+            if pos or x not in nodepos:
+                nodepos[x] = pos or None
+    if text[i:].strip(): # anything after the graph
+        return None
+    return (nodepos, edgepos)
+
+def readpositions(fname):
+    '''read node and edge positions from a dot or xdot file
+
+    Returns (nodepos, edgepos): dicts from node name and from edge (source, target, key)
+    to the pos attribute (None if not set); the names and keys are strings, the key is None
+    for edges without a key.
+    '''
+    with open(fname, encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    positions = parsepositions(text)
+    if positions is not None:
+        return positions
+    L = pgv.AGraph(fname)
+    nodepos = {str(v): v.attr.get('pos') or None for v in L.nodes()}
+    edgepos = {(str(u), str(v), x): L.get_edge(u, v, key=x).attr.get('pos') or None
+      for (u, v, x) in L.edges(keys=True)}
+    return (nodepos, edgepos)
@@ -0,0 +1,149 @@
+'''evaluation of column expressions (group definitions, colexpr etc.) for tabnetviz'''
+
+# Copyright 2019 Andras Szilagyi
+# Distributed under the GNU General Public License v3
+# See https://www.gnu.org/licenses/gpl-3.0.html
+
+import io
+import ast
+import math
+import tokenize
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numexpr
+except ImportError: # optional, expressions are evaluated by pandas if not available
+    numexpr = None
+
+# operators that give the same results in numexpr as in pandas
+# (for these column types; numexpr widens narrower integers instead of wrapping around
+# like pandas, and computes float32 columns with float64 constants in float64)
+dtypes = [np.dtype('bool'), np.dtype('int64'), np.dtype('float64')]
+binops = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/'}
+cmpops = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!='}
+boolops = {ast.And: '&', ast.Or: '|'}
+
+class Expression():
+    '''a column expression, parsed once and evaluated on any number of tables
+
+    Expressions made of numerical and Boolean table columns, number constants,
+    arithmetic operators, comparisons and Boolean operators are translated to numexpr
+    (if available) and evaluated by it on int64, float64 and Boolean columns; anything
+    else is evaluated by pandas.
+    '''
+    def __init__(self, expr):
+        self.expr = expr
+        self.columns = [] # names of the columns used, in numexpr as v0, v1, ...
+        self.kinds = {} # column name -> allowed dtype kinds (depending on use)
+        self.column = None # the column name if the expression is a single column
+        self.numexpr = None # translation to numexpr, None if not possible
+        self.names = None # all names in the expression, None if it cannot be parsed
+        # like pandas, treat & and | as 'and' and 'or' (with their low precedence)
+        try:
+            tokens = [(tokenize.NAME, {'&': 'and', '|': 'or'}[t.string]) if
+              t.type == tokenize.OP and t.string in '&|' else (t.type, t.string)
+              for t in tokenize.generate_tokens(io.StringIO(expr.strip()).readline)]
+            tree = ast.parse(tokenize.untokenize(tokens), mode='eval').body
+        except (SyntaxError, tokenize.TokenError): # e.g. `quoted` column names
+            return
+        self.names = set(n.id for n in ast.walk(tree) if isinstance(n, ast.Name))
+        if isinstance(tree, ast.Name):
+            self.column = tree.id
+        if numexpr:
+            self.numexpr = self.translate(tree)
+    def var(self, name, kinds):
+        '''numexpr variable name of a column'''
+        if name not in self.columns:
+            self.columns.append(name)
+        self.kinds[name] = set(self.kinds.get(name, 'biuf')) & set(kinds)
+        return 'v%d' % (self.columns.index(name))
+    def translate(self, node, boolean=False, compared=False):
+        '''translate an expression tree to numexpr, or return None if not possible'''
+        args = None
+        if isinstance(node, ast.Name):
+            return self.var(node.id, 'b' if boolean else 'biuf' if compared else 'iuf')
+        elif isinstance(node, ast.Constant):
+            if type(node.value) == bool:
+                return str(node.value)
+            if type(node.value) in [int, float] and math.isfinite(node.value) and not boolean:
+                return repr(node.value)
+        elif isinstance(node, ast.BinOp) and type(node.op) in binops and not boolean:
+            args = [self.translate(node.left), self.translate(node.right)]
+            op = binops[type(node.op)]
+        elif isinstance(node, ast.UnaryOp) and type(node.op) == ast.USub and not boolean:
+            args = [self.translate(node.operand)]
+            op = '-'
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in [ast.Not, ast.Invert]:
+            args = [self.translate(node.operand, boolean=True)]
+            op = '~'
+        elif isinstance(node, ast.BoolOp):
+            args = [self.translate(v, boolean=True) for v in node.values]
+            op = boolops[type(node.op)]
+        elif isinstance(node, ast.Compare) and all(type(o) in cmpops for o in node.ops):
+            # chained comparisons are joined by &
+            operands = [self.translate(o, compared=True) for o in [node.left]+node.comparators]
+            if None in operands:
+                return None
+            return '&'.join('(%s%s%s)' % (operands[i], cmpops[type(node.ops[i])],
+              operands[i+1]) for i in range(len(node.ops)))
+        if not args or None in args:
+            return None
+        if len(args) == 1:
+            return '(%s%s)' % (op, args[0])
+        return '('+op.join(args)+')'
+    def numexprok(self, tab):
+        '''whether the expression can be evaluated on tab with numexpr'''
+        for c in self.columns:
+            if c not in tab.columns:
+                return False
+            dtype = tab[c].dtype
+            if dtype not in dtypes:
+                return False
+            if dtype.kind not in self.kinds[c]:
+                return False
+        return True
+    def evaluate(self, tab):
+        '''evaluate the expression on table tab, return a Series'''
+        if self.column in tab.columns:
+            return tab[self.column]
+        if self.numexpr and self.numexprok(tab):
+            try:
+                values = numexpr.evaluate(self.numexpr,
+                  local_dict={'v%d' % (i): tab[c].values for (i, c) in enumerate(self.columns)})
+                return pd.Series(values, index=tab.index)
+            except (TypeError, ValueError, NotImplementedError): # let pandas try
+                pass
+        return tab.eval(self.expr, engine='python')
+
+compiled = {} # expression string -> Expression
+
+def parse(expr):
+    '''return the Expression object for expression string expr'''
+    if expr not in compiled:
+        compiled[expr] = Expression(expr)
+    return compiled[expr]
+
+def names(expr):
+    '''set of names (possibly column names) in expr, or None if it cannot be parsed'''
+    return parse(str(expr)).names
+
+def evaluate(tab, expr, key):
+    '''evaluate column expression expr on table tab; key is where expr is in the config file'''
+    try:
+        return parse(expr).evaluate(tab)
+    except Exception as e:
+        raise ValueError('cannot evaluate expression "%s" (%s): %s' % (expr, key, e)) from e
+
+def select(tab, expr, key):
+    '''index of the rows of tab for which Boolean expression expr is true'''
+    mask = evaluate(tab, expr, key)
+    if mask.dtype != bool:
+        try:
+            mask = mask.astype(bool) if set(mask) <= {True, False} else None
+        except TypeError: # unhashable values
+            mask = None
+        if mask is None:
+            raise ValueError('expression "%s" (%s) is not a Boolean expression' % (expr, key))
+    return tab.index[mask.values]
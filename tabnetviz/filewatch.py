@@ -0,0 +1,138 @@
+'''file change watchers for the watch mode of tabnetviz'''
+
+# Copyright 2019 Andras Szilagyi
+# Distributed under the GNU General Public License v3
+# See https://www.gnu.org/licenses/gpl-3.0.html
+
+import os
+import select
+import struct
+import ctypes
+from time import sleep
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# directories are watched rather than the files, so that editors and programs
+# replacing a file (writing a new one and renaming it) are also noticed
+WATCHMASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+  | IN_DELETE)
+EVENTHEADER = struct.Struct('iIII') # wd, mask, cookie, len
+
+DEBOUNCE = 0.2 # seconds without further changes before reporting a change
+POLLINTERVAL = 0.5 # seconds
+
+def mtime(fname):
+    '''modification time of a file, or None if it does not exist'''
+    try:
+        return os.stat(fname).st_mtime
+    except (OSError, TypeError):
+        return None
+
+class PollingWatcher():
+    '''watch files by checking their modification times periodically'''
+    def __init__(self, files, interval=POLLINTERVAL):
+        self.interval = interval
+        self.mtimes = {}
+        self.setfiles(files)
+    def setfiles(self, files):
+        '''change the set of watched files'''
+        files = set(os.path.abspath(f) for f in files)
+        self.mtimes = {f: self.mtimes[f] if f in self.mtimes else mtime(f) for f in files}
+    def changes(self):
+        '''return the set of files changed since the last check'''
+        changed = set()
+        for f in self.mtimes:
+            mt = mtime(f)
+            if mt != self.mtimes[f]:
+                changed.add(f)
+                self.mtimes[f] = mt
+        return changed
+    def wait(self, debounce=DEBOUNCE):
+        '''wait until a watched file changes, and return the set of changed files'''
+        changed = set()
+        while not changed:
+            sleep(self.interval)
+            changed = self.changes()
+        # wait until the files are no longer being written
+        while True:
+            sleep(max(debounce, self.interval))
+            more = self.changes()
+            if not more:
+                return changed
+            changed |= more
+    def close(self):
+        pass
+
+class InotifyWatcher():
+    '''watch files using the Linux inotify interface, without polling'''
+    def __init__(self, files):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.addwatch = libc.inotify_add_watch
+        self.addwatch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {} # watch descriptor -> directory
+        self.setfiles(files)
+    def setfiles(self, files):
+        '''change the set of watched files'''
+        self.files = set(os.path.abspath(f) for f in files)
+        for d in set(os.path.dirname(f) for f in self.files)-set(self.dirs.values()):
+            wd = self.addwatch(self.fd, os.fsencode(d), WATCHMASK)
+            if wd >= 0: # a missing directory cannot be watched, will be added later
+                self.dirs[wd] = d
+    def changes(self, timeout):
+        '''return the set of changed files from the events arriving within timeout
+
+        With timeout None, wait until there are events. Return None if there were no
+        events at all.
+        '''
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return None
+        changed = set()
+        data = os.read(self.fd, 65536)
+        i = 0
+        while i < len(data):
+            (wd, mask, cookie, namelen) = EVENTHEADER.unpack_from(data, i)
+            i += EVENTHEADER.size
+            name = os.fsdecode(data[i:i+namelen].rstrip(b'\0'))
+            i += namelen
+            if mask & IN_Q_OVERFLOW: # events were lost
+                changed |= self.files
+            elif mask & IN_IGNORED: # directory deleted
+                self.dirs.pop(wd, None)
+            elif wd in self.dirs:
+                fname = os.path.join(self.dirs[wd], name)
+                if fname in self.files:
+                    changed.add(fname)
+        return changed
+    def wait(self, debounce=DEBOUNCE):
+        '''wait until a watched file changes, and return the set of changed files'''
+        changed = set()
+        while not changed:
+            changed = self.changes(None)
+        # collect further changes until there are no events for a while
+        while True:
+            more = self.changes(debounce)
+            if more is None:
+                return changed
+            changed |= more
+    def close(self):
+        os.close(self.fd)
+
+def watcher(files):
+    '''return an inotify-based watcher if available, otherwise a polling watcher'''
+    try:
+        return InotifyWatcher(files)
+    except (OSError, AttributeError, TypeError): # not on Linux
+        return PollingWatcher(files)
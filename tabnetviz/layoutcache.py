@@ -0,0 +1,88 @@
+'''on-disk cache of graph layouts for tabnetviz'''
+
+# Copyright 2019 Andras Szilagyi
+# Distributed under the GNU General Public License v3
+# See https://www.gnu.org/licenses/gpl-3.0.html
+
+import os
+import json
+import hashlib
+
+import pandas as pd
+
+from tabnetviz import nacache
+
+CACHEVERSION = '2' # change when the stored layout format changes
+DEFAULTMAXSIZE = 200 # megabytes
+
+# Graphviz attributes that do not change the positions computed by the layout programs
+# (colors, links, tooltips etc.); all other attributes are assumed to affect the layout
+NOLAYOUTATTRS = set('''color fillcolor fontcolor bgcolor pencolor labelfontcolor colorscheme
+  gradientangle style tooltip edgetooltip headtooltip tailtooltip labeltooltip URL href
+  edgeURL edgehref headURL headhref tailURL tailhref labelURL labelhref target edgetarget
+  headtarget tailtarget labeltarget id class comment outputorder'''.split())
+
+# attributes set by the Graphviz layout programs (positions and computed sizes), stored
+# in the cache so that a cached layout gives the same dot file as a new one
+NODELAYOUTATTRS = ['pos', 'width', 'height', 'rects', 'xlp']
+EDGELAYOUTATTRS = ['pos', 'lp', 'head_lp', 'tail_lp', 'xlp']
+GRAPHLAYOUTATTRS = ['bb', 'lp', 'lwidth', 'lheight']
+
+def attrstring(attrs):
+    '''the layout-affecting items of an attribute dict as a string'''
+    return repr(sorted((str(a), str(v)) for (a, v) in attrs.items() if a not in NOLAYOUTATTRS))
+
+def layoutkey(net, prog, sources, targets):
+    '''hash of the graph description net (made by applystyles) as far as the layout is
+    concerned; sources, targets: pandas Series of the edge ends'''
+    h = hashlib.sha256()
+    h.update(('tabnetviz-layout-%s %s %s' % (CACHEVERSION, prog, net['directed'])).encode())
+    for d in ['graphattrs', 'nodedefaults', 'edgedefaults']:
+        h.update(attrstring(net[d]).encode())
+    for (clusname, parent, nodes, clusattrs) in net['clusters']:
+        h.update(repr((clusname, parent, sorted(map(str, nodes)),
+          attrstring(clusattrs))).encode())
+    cols = [net['nodeattrs'].index.to_series(), sources, targets,
+      net['edgeattrs'].index.to_series()]
+    for attrs in [net['nodeattrs'], net['edgeattrs']]:
+        names = sorted(str(c) for c in attrs.columns if c not in NOLAYOUTATTRS)
+        h.update(repr(names).encode())
+        cols += [attrs[c] for c in names]
+    for col in cols:
+        h.update(pd.util.hash_pandas_object(col.astype(str), index=False).values.tobytes())
+    return h.hexdigest()
+
+class LayoutCache(nacache.AnalysisCache):
+    '''content-addressed cache of node, edge, cluster and graph layout attributes
+
+    Files (one .layout.json file per layout) are keyed on the node list, the edge list,
+    the layout program and the layout-affecting attributes of the graph description made
+    by applystyles. The least recently used files are deleted when the total size
+    exceeds maxsize (in megabytes).
+    '''
+    suffix = '.layout.json'
+    def filename(self, key):
+        return os.path.join(self.dirname, key+self.suffix)
+    def get(self, key):
+        '''return the cached layout (dict, see getlayout in __main__), or None'''
+        fname = self.filename(key)
+        try:
+            with open(fname) as f:
+                layout = json.load(f)
+            os.utime(fname) # mark as recently used
+        except (OSError, ValueError):
+            return None
+        return layout
+    def put(self, key, layout):
+        '''store a layout in the cache'''
+        fname = self.filename(key)
+        try:
+            os.makedirs(self.dirname, exist_ok=True)
+            tmpname = fname+'.%d.tmp' % (os.getpid())
+            with open(tmpname, 'w') as f:
+                json.dump(layout, f, separators=(',', ':'))
+            os.replace(tmpname, fname)
+        except OSError as e:
+            print('Warning: could not write layout cache:', e)
+            return
+        self.evict()
@@ -0,0 +1,190 @@
+'''C-implemented backends (igraph, scipy.sparse.csgraph) for the network analysis of tabnetviz'''
+
+# Copyright 2019 Andras Szilagyi
+# Distributed under the GNU General Public License v3
+# See https://www.gnu.org/licenses/gpl-3.0.html
+#
+# The backends give the same raw values as the networkx-based functions in netanalyzer
+# (e.g. unnormalized betweenness counting both directions of undirected paths, distance
+# sums from each node), so that the normalization done there (per connected component,
+# distances from the node for closeness etc.) is applied to them in the same way.
+
+import numpy as np
+
+try:
+    import igraph
+except ImportError: # optional
+    igraph = None
+
+try:
+    import scipy.sparse
+    import scipy.sparse.csgraph
+except ImportError: # optional
+    scipy = None
+
+backends = ['networkx', 'igraph', 'csgraph']
+modules = {'igraph': 'igraph', 'csgraph': 'scipy'}
+
+DISTBATCH = 10000000 # number of distances calculated at a time (memory: 8 bytes each)
+
+class Network():
+    '''arrays describing a networkx graph G whose nodes are numbers; the arrays refer to
+    the nodes by their positions 0..n-1 in G'''
+    def __init__(self, G):
+        self.n = len(G)
+        self.directed = G.is_directed()
+        self.nodes = np.array(list(G), dtype=np.int64).reshape(-1)
+        edges = np.array(list(G.edges(data='multiplicity', default=1)),
+          dtype=np.int64).reshape(-1, 3)
+        # edges (parallel edges of multigraphs separately) and their multiplicities
+        (self.sources, self.targets) = self.positions(edges[:, :2]).T
+        self.multiplicity = edges[:, 2]
+        # node pairs connected (parallel edges once), as in netanalyzer.adjacency()
+        self.pairs = list(dict.fromkeys(G.edges()))
+        # neighbor pairs of the undirected simple graph without self-loops, both ways
+        pairs = self.positions(np.array(self.pairs, dtype=np.int64).reshape(-1, 2))
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        both = np.unique(np.vstack([pairs, pairs[:, ::-1]]), axis=0)
+        (self.ufrom, self.uto) = (both[:, 0], both[:, 1])
+    def positions(self, nodes):
+        '''positions of the nodes (array of node numbers) in G'''
+        if np.array_equal(self.nodes, np.arange(self.n)):
+            return nodes
+        order = np.argsort(self.nodes)
+        return order[np.searchsorted(self.nodes[order], nodes)]
+    def todict(self, values, start=0):
+        '''dict from node number to value (Python numbers); values are for the nodes from
+        position start on'''
+        return dict(zip(self.nodes[start:start+len(values)].tolist(), values.tolist()))
+    def count(self, nodes, select=slice(None)):
+        '''number of edges at each node; nodes: one end of each edge'''
+        return np.bincount(nodes[select], weights=self.multiplicity[select],
+          minlength=self.n).astype(np.int64)
+    def degree(self):
+        return self.todict(self.count(self.sources)+self.count(self.targets))
+    def indegree(self):
+        return self.todict(self.count(self.targets))
+    def outdegree(self):
+        return self.todict(self.count(self.sources))
+    def selfloops(self):
+        return self.todict(self.count(self.sources, self.sources == self.targets))
+    def connectivity(self):
+        '''number of neighbors'''
+        return np.bincount(self.ufrom, minlength=self.n)
+    def neighborhoodconnectivity(self):
+        conn = self.connectivity()
+        total = np.bincount(self.ufrom, weights=conn[self.uto], minlength=self.n)
+        return self.todict(np.divide(total, conn, out=np.zeros(self.n), where=conn > 0))
+    def matrix(self, directed):
+        '''sparse 0/1 adjacency matrix of the simple graph without self-loops'''
+        if directed:
+            pairs = self.positions(np.array(self.pairs, dtype=np.int64).reshape(-1, 2))
+            pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+            (rows, cols) = (pairs[:, 0], pairs[:, 1])
+        else:
+            (rows, cols) = (self.ufrom, self.uto)
+        return scipy.sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)),
+          shape=(self.n, self.n))
+    def clustering(self):
+        '''clustering coefficient as in nx.clustering, from triangle counts'''
+        A = self.matrix(self.directed)
+        # S: undirected adjacency counting both directions; diag(S^3): closed walks
+        S = A+A.T if self.directed else A
+        triangles = np.asarray((S @ S).multiply(S).sum(axis=1)).ravel()
+        if self.directed:
+            dtotal = np.asarray(S.sum(axis=1)).ravel()
+            dbidir = np.asarray(A.multiply(A.T).sum(axis=1)).ravel()
+            denom = 2*(dtotal*(dtotal-1)-2*dbidir)
+        else:
+            degree = np.asarray(A.sum(axis=1)).ravel()
+            denom = degree*(degree-1)
+        values = [t/d if t > 0 else 0 for (t, d) in zip(triangles.tolist(), denom.tolist())]
+        return dict(zip(self.nodes.tolist(), values))
+    def distancestats(self, distances):
+        '''ecc, totdist, nreach as in netanalyzer.shortestpathstats from a function giving
+        the rows of the distance matrix (inf: not reachable) for a range of source nodes'''
+        (ecc, totdist, nreach) = ({}, {}, {})
+        batch = max(1, DISTBATCH//max(1, self.n))
+        for start in range(0, self.n, batch):
+            dist = distances(range(start, min(start+batch, self.n)))
+            reached = np.isfinite(dist)
+            dist[~reached] = 0
+            dist = dist.astype(np.int64)
+            ecc.update(self.todict(dist.max(axis=1), start))
+            totdist.update(self.todict(dist.sum(axis=1), start))
+            nreach.update(self.todict(reached.sum(axis=1), start))
+        return {'ecc': ecc, 'totdist': totdist, 'nreach': nreach}
+
+class CsgraphNetwork(Network):
+    '''network analysis with scipy.sparse.csgraph'''
+    def pathstats(self, stress=False, betweenness=False, edgebetweenness=False):
+        A = self.matrix(True)
+        return self.distancestats(lambda sources: scipy.sparse.csgraph.shortest_path(A,
+          method='D', directed=self.directed, unweighted=True, indices=list(sources)))
+
+class IgraphNetwork(Network):
+    '''network analysis with igraph'''
+    def __init__(self, G):
+        Network.__init__(self, G)
+        # simple graph without self-loops: parallel edges do not count as separate paths
+        self.simplepairs = [(u, v) for (u, v) in self.pairs if u != v]
+        edges = self.positions(np.array(self.simplepairs, dtype=np.int64).reshape(-1, 2))
+        self.g = igraph.Graph(n=self.n, edges=edges.tolist(), directed=self.directed)
+    def pathstats(self, stress=False, betweenness=False, edgebetweenness=False):
+        sp = self.distancestats(lambda sources: np.array(self.g.distances(source=list(sources),
+          mode='out'), dtype=float).reshape(-1, self.n))
+        # undirected paths are counted in both directions in netanalyzer
+        f = 1 if self.directed else 2
+        if betweenness:
+            sp['betweenness'] = self.todict(f*np.array(self.g.betweenness(
+              directed=self.directed), dtype=float))
+        if edgebetweenness:
+            ebc = dict.fromkeys(self.pairs, 0.0) # self-loops are on no shortest path
+            ebc.update(zip(self.simplepairs,
+              (f*np.array(self.g.edge_betweenness(directed=self.directed))).tolist()))
+            sp['edgebetweenness'] = ebc
+        return sp
+    def clustering(self):
+        if self.directed: # not available in igraph
+            return None
+        values = self.g.transitivity_local_undirected(mode='zero')
+        return dict(zip(self.nodes.tolist(), values))
+
+def network(backend, G):
+    '''return a Network object for backend, or None if the backend is networkx or not
+    available (a warning is printed in that case)'''
+    if backend not in backends:
+        raise ValueError('Unknown network analysis backend: %s (should be one of %s)' % (
+          backend, ', '.join(backends)))
+    if backend == 'networkx':
+        return None
+    if (igraph if backend == 'igraph' else scipy) is None:
+        print('Warning: the %s module is needed for the %s backend, using networkx instead; '
+          'install it with "pip install %s"' % (modules[backend], backend, modules[backend]))
+        return None
+    return IgraphNetwork(G) if backend == 'igraph' else CsgraphNetwork(G)
+
+def calculate(backend, G, quantities, pathkwargs=None):
+    '''calculate those of the quantities that the backend can do
+
+    G: networkx graph whose nodes are numbers; quantities: names of the quantities not based on
+    the shortest path statistics; pathkwargs: None or the flags for shortestpathstats if
+    path based quantities are needed. Returns (dics, sp): the dicts of the quantities
+    calculated (node number -> value), and the shortest path statistics calculated, in
+    the form returned by netanalyzer.shortestpathstats.
+    '''
+    net = network(backend, G)
+    if net is None:
+        return ({}, {})
+    funcs = {'Degree': net.degree, 'Indegree': net.indegree, 'Outdegree': net.outdegree,
+      'SelfLoops': net.selfloops, 'Connectivity': lambda: net.todict(net.connectivity()),
+      'NeighborhoodConnectivity': net.neighborhoodconnectivity,
+      'ClusteringCoefficient': net.clustering}
+    dics = {}
+    for q in quantities:
+        if q in funcs:
+            dic = funcs[q]()
+            if dic is not None:
+                dics[q] = dic
+    sp = net.pathstats(**pathkwargs) if pathkwargs is not None else {}
+    return (dics, sp)
@@ -0,0 +1,84 @@
+'''on-disk cache of network analysis results for tabnetviz'''
+
+# Copyright 2019 Andras Szilagyi
+# Distributed under the GNU General Public License v3
+# See https://www.gnu.org/licenses/gpl-3.0.html
+
+import os
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+CACHEVERSION = '2' # change when the calculated values change
+DEFAULTMAXSIZE = 200 # megabytes
+
+class AnalysisCache():
+    '''content-addressed cache of calculated quantities, one .npz file per quantity
+
+    Files are keyed on the node list, the edge list, the network type and the
+    quantity name. The least recently used files are deleted when the total size
+    exceeds maxsize (in megabytes).
+    '''
+    suffix = '.npz'
+    def __init__(self, dirname, maxsize=DEFAULTMAXSIZE):
+        self.dirname = dirname
+        self.maxsize = maxsize*1024*1024
+    def networkkey(self, nodes, sources, targets, directed):
+        '''hash of the network; nodes, sources, targets are pandas Series'''
+        h = hashlib.sha256()
+        h.update(('tabnetviz-cache-%s %s %d %d' % (CACHEVERSION, directed, len(nodes),
+          len(sources))).encode())
+        for col in [nodes, sources, targets]:
+            h.update(pd.util.hash_pandas_object(col, index=False).values.tobytes())
+        return h.hexdigest()
+    def filename(self, netkey, quantity, variant=''):
+        key = hashlib.sha256((netkey+' '+quantity+' '+variant).encode()).hexdigest()
+        return os.path.join(self.dirname, key+self.suffix)
+    def get(self, netkey, quantity, variant=''):
+        '''return cached values as a list, or None if not in the cache'''
+        fname = self.filename(netkey, quantity, variant)
+        try:
+            with np.load(fname, allow_pickle=False) as f:
+                values = f['values'].tolist()
+            os.utime(fname) # mark as recently used
+        except (OSError, KeyError, ValueError):
+            return None
+        return values
+    def put(self, netkey, quantity, values, variant=''):
+        '''store values (a list of numbers) in the cache'''
+        arr = np.asarray(values)
+        if arr.dtype.kind not in 'biuf': # only numbers are cached
+            return
+        fname = self.filename(netkey, quantity, variant)
+        try:
+            os.makedirs(self.dirname, exist_ok=True)
+            tmpname = fname+'.%d.tmp' % (os.getpid())
+            with open(tmpname, 'wb') as f:
+                np.savez(f, values=arr)
+            os.replace(tmpname, fname)
+        except OSError as e:
+            print('Warning: could not write network analysis cache:', e)
+            return
+        self.evict()
+    def evict(self):
+        '''delete least recently used files above the size limit'''
+        files = []
+        for fname in os.listdir(self.dirname):
+            if not fname.endswith(self.suffix):
+                continue
+            path = os.path.join(self.dirname, fname)
+            try:
+                st = os.stat(path)
+            except OSError: # deleted meanwhile
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for (mtime, size, path) in files)
+        for (mtime, size, path) in sorted(files):
+            if total <= self.maxsize:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
@@ -7,149 +7,623 @@
 # Thanks to Zsofia Feher for an initial version of this module
 
 import sys
+import math
 import difflib
+from itertools import chain
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import networkx as nx
+import numpy as np
 import pandas as pd
 
+try:
+    import scipy.sparse
+    import scipy.sparse.csgraph
+except ImportError: # optional, connected components are found by networkx if not available
+    scipy = None
+
 from tabnetviz.kwcheck import kwcheck
+from tabnetviz import nabackends
         
+# Graphs made by calcquant have no parallel edges; the number of edges between two nodes
+# is given by the 'multiplicity' edge attribute (1 if not given), used by the quantities
+# counting edges. The functions also work on networkx multigraphs.
+
 def Degree(G):
-    return G.degree
+    return G.degree(weight='multiplicity')
 
 def Indegree(G):
-    return G.in_degree
+    return G.in_degree(weight='multiplicity')
 
 def Outdegree(G):
-    return G.out_degree
+    return G.out_degree(weight='multiplicity')
+
+def preprocess(G):
+    '''undirected view of graph G shared by the quantities, built in one pass over the edges
+
+    Returns a dict: 'simple': undirected graph without parallel edges and self-loops (G
+    itself if it is such a graph), 'selfloops': number of self-loop edges of each node,
+    'components': list of the connected components (sets of nodes).
+    '''
+    selfloops = dict.fromkeys(G, 0)
+    for (u, v, k) in nx.selfloop_edges(G, data='multiplicity', default=1):
+        selfloops[u] += k
+    if G.is_directed() or G.is_multigraph() or any(selfloops.values()):
+        H = nx.Graph()
+        H.add_nodes_from(G)
+        # edges in the order of the undirected view of G, so that neighbors (and sums over
+        # them) come in the same order
+        H.add_edges_from((u, v) for (u, v) in nx.to_undirected(G).edges() if u != v)
+    else:
+        H = G
+    return {'simple': H, 'selfloops': selfloops,
+      'components': list(nx.connected_components(H))}
 
-def Connectivity(G):
+def Connectivity(G, pre=None):
     '''number of neighbors of a node (can differ from Degree which is the number of edges)'''
-    H = nx.to_undirected(G).copy() # convert to undirected
-    R = list(nx.selfloop_edges(H))
-    for (u, v) in R:
-        H.remove_edge(u, v) # remove self-loop edges
-    conn = {v: len(H.adj[v]) for v in H} # connectivity (=number of neighbors)
-    return conn
-
-def BetweennessCentrality(G):
+    if pre is None:
+        pre = preprocess(G)
+    H = pre['simple']
+    return {v: len(H.adj[v]) for v in G}
+
+def BetweennessCentrality(G, sp=None, pre=None):
+    if sp is None or 'betweenness' not in sp:
+        sp = shortestpathstats(G, betweenness=True)
+    # same as nx.betweenness_centrality(G, normalized=False)
+    bc_nonnorm = sp['betweenness']
+    if not G.is_directed():
+        bc_nonnorm = {v: 0.5*bc_nonnorm[v] for v in bc_nonnorm}
     # we normalize separately for each connected component
-    bc_nonnorm = nx.betweenness_centrality(G, normalized=False)
-    S = list(nx.connected_components(nx.to_undirected(G)))
+    if pre is None:
+        pre = preprocess(G)
+    S = pre['components']
     f = 1 if G.is_directed() else 2
     normf = [0 if len(c) in [1, 2] else f/(len(c)-1)/(len(c)-2) for c in S]
     compdic = {v: j for (j, H) in enumerate(S) for v in H}
     bc_norm = {v: bc_nonnorm[v]*normf[compdic[v]] for v in bc_nonnorm}
     return bc_norm
 
-def ClosenessCentrality(G):
-    if not G.is_directed():
-        return nx.closeness_centrality(G, wf_improved=False)
-    return nx.closeness_centrality(G.reverse(), wf_improved=False)
+def ClosenessCentrality(G, sp=None):
+    # same as nx.closeness_centrality(G, wf_improved=False) for undirected graphs and
+    # nx.closeness_centrality(G.reverse(), wf_improved=False) for directed graphs,
+    # i.e. based on distances from the node
+    if sp is None:
+        sp = shortestpathstats(G)
+    nreach = sp['nreach']
+    totdist = sp['totdist']
+    return {v: (nreach[v]-1.0)/totdist[v] if totdist[v] > 0 and len(G) > 1 else 0.0 for v in G}
 
-def ClusteringCoefficient(G):
+def ClusteringCoefficient(G, pre=None):
     # NOTE: clustering coefficient definition for directed networks is slightly
     # different in Networkx than in Cytoscape's Network Analyzer
     # thus, numerical results will be slightly different for some of the nodes.
     # We stick to Networkx here.
     if G.is_multigraph(): # clustering coefficient not implemented for multigraphs
-        print('Warning: Converting multi-graph to simple for clustering coefficient calculation')
-        H = nx.DiGraph(G) if G.is_directed() else nx.Graph(G) # convert to non-multi
-        return nx.clustering(H)
+        if G.is_directed():
+            return nx.clustering(nx.DiGraph(G))
+        # self-loops do not count in nx.clustering
+        if pre is None:
+            pre = preprocess(G)
+        return nx.clustering(pre['simple'])
     return nx.clustering(G)
 
-def Eccentricity(G):
+def Eccentricity(G, sp=None):
     # networkx implementation throws error for disconnected/not strongly connected graphs
     # so re-implement like NetworkAnalyzer
-    col = {v: max(dic.values()) for (v, dic) in nx.all_pairs_shortest_path_length(G)}
-    return col
+    if sp is None:
+        sp = shortestpathstats(G)
+    return sp['ecc']
 
-def NeighborhoodConnectivity(G):
-    H = nx.to_undirected(G).copy() # convert to undirected
-    R = list(nx.selfloop_edges(H))
-    for (u, v) in R:
-        H.remove_edge(u, v) # remove self-loop edges
-    conn = {v: len(H.adj[v]) for v in H} # connectivity (=number of neighbors)
-    return {v: sum(conn[n]/conn[v] for n in H.neighbors(v)) for v in G}
+def NeighborhoodConnectivity(G, pre=None):
+    if pre is None:
+        pre = preprocess(G)
+    H = pre['simple']
+    conn = Connectivity(G, pre) # connectivity (=number of neighbors)
+    return {v: sum(conn[n]/conn[v] for n in H.adj[v]) for v in G}
     
-def AverageShortestPathLength(G):
+def AverageShortestPathLength(G, sp=None):
+    if sp is None:
+        sp = shortestpathstats(G)
     col = {}
-    dicdic = dict(nx.all_pairs_shortest_path_length(G))
     for v in G.nodes:
-        dic = dicdic[v]
-        n = len(dic)
+        n = sp['nreach'][v]
         if n == 1:
             col[v] = 0.0 # isolated node
         else:
-            col[v] = sum(dic.values())/(n-1)
+            col[v] = sp['totdist'][v]/(n-1)
     return col
 
-def Radiality(G):
-    avsp = AverageShortestPathLength(G)
-    S = [G.subgraph(c).copy() for c in nx.connected_components(G)]
-    dia = [nx.diameter(H) for H in S]
+def Radiality(G, sp=None, pre=None):
+    if sp is None:
+        sp = shortestpathstats(G)
+    if pre is None:
+        pre = preprocess(G)
+    avsp = AverageShortestPathLength(G, sp)
+    # diameter of each component is the largest eccentricity within it
+    S = pre['components']
+    dia = [max(sp['ecc'][v] for v in c) for c in S]
     compdic = {v: j for (j, H) in enumerate(S) for v in H}
     vdia = {v: dia[compdic[v]] for v in G}
     rad = {v: float('inf') if vdia[v] == 0 else (vdia[v]-avsp[v]+1)/vdia[v] for v in G}
     return rad
     
-def EdgeBetweenness(G):
-    ebc = nx.edge_betweenness_centrality(G, normalized=False)
-    if G.is_directed():
-        return ebc
-    return {v: 2*ebc[v] for v in ebc}
-
-def SelfLoops(G):
-    return {v: list(G.edges()).count((v, v)) for v in G.nodes}
-
-def Stress(G):
-    # shortest paths
-    paths = []
-    # v is part of how many shortest paths
-    for u in G:
-        for v in G:
-            if v == u:
-                continue
-            if not nx.has_path(G, u, v):
-                continue
-            for path in nx.all_shortest_paths(G, u, v):
-                paths.append(path[1:-1])
-    col = {v: [v in path for path in paths].count(True) for v in G}
-    return col
+def EdgeBetweenness(G, sp=None):
+    # same as nx.edge_betweenness_centrality(G, normalized=False), doubled for
+    # undirected graphs
+    if sp is None or 'edgebetweenness' not in sp:
+        sp = shortestpathstats(G, edgebetweenness=True)
+    ebc = sp['edgebetweenness']
+    # divide among parallel edges
+    if G.is_multigraph():
+        ebc = {e: ebc[e]/G.number_of_edges(*e) for e in ebc}
+    else:
+        multiplicity = nx.get_edge_attributes(G, 'multiplicity')
+        if multiplicity:
+            ebc = {e: ebc[e]/multiplicity[e] for e in ebc}
+    return ebc
+
+def SelfLoops(G, pre=None):
+    if pre is None:
+        pre = preprocess(G)
+    return dict(pre['selfloops'])
 
-def TopologicalCoefficient(G):
-    # remove self-loops
-    H = G.copy()
-    R = list(nx.selfloop_edges(H))
-    for (u, v) in R:
-        H.remove_edge(u, v) # remove self-loop edges
+def Stress(G, sp=None):
+    # number of shortest paths passing through each node, counted with a
+    # Brandes-style accumulation in the shared shortest path pass
+    if sp is None or 'stress' not in sp:
+        sp = shortestpathstats(G, stress=True)
+    return sp['stress']
+
+def TopologicalCoefficient(G, pre=None):
     # average number of shared neighbors with other nodes
+    # only nodes reachable in two steps share neighbors with a node, so count
+    # shared neighbors by walking the two-step neighborhood (without self-loops)
+    if pre is None:
+        pre = preprocess(G)
+    adj = pre['simple'].adj
     col = {}
-    for n in H: # iterate on nodes
-        kn = len(H.adj[n]) # number of neighbors (!= degree for multigraphs)
+    for n in G: # iterate on nodes
+        nneib = adj[n]
+        kn = len(nneib) # number of neighbors (!= degree for multigraphs)
         if kn in [0, 1]:
             col[n] = 0
             continue
-        nneib = set(H.neighbors(n))
-        Nm = 0
-        sumshared = 0
-        for m in H: # iterate on other nodes
-            if m == n:
-                continue
-            mneib = set(H.neighbors(m))
-            numshared = len(nneib & mneib)
-            if numshared > 0: # if n and m have shared neighbors
-                Nm += 1
-                if m in nneib:
-                    numshared += 1 # add 1 if n and m are neighbors
-                sumshared += numshared
+        shared = {} # number of shared neighbors for nodes m sharing a neighbor with n
+        for u in nneib:
+            for m in adj[u]:
+                if m != n:
+                    shared[m] = shared.get(m, 0)+1
+        Nm = len(shared)
+        # add 1 for each m if n and m are neighbors
+        sumshared = sum(shared.values())+sum(1 for m in shared if m in nneib)
         avg = sumshared/Nm if Nm > 0 else 0
         col[n] = avg/kn
     return col
 
-def calcquant(nodetab, idcol, edgetab, sourcecol, targetcol, directed, quant='all'):
-    '''calculate the requested quantities for network'''
+def adjacency(G):
+    '''compact adjacency lists of graph G, with the nodes numbered in the order of G
+
+    Returns (nodes, nbrs, eids, edges): nodes is the list of nodes; nbrs[j] lists the
+    numbers of the neighbors (successors) of node j in the order of G[node]; eids[j] gives
+    for each of them the index of the edge in edges, the list of the node pairs connected
+    (parallel edges are represented by a single pair, like in G[node]).
+    '''
+    nodes = list(G)
+    index = {v: j for (j, v) in enumerate(nodes)}
+    edges = list(dict.fromkeys(G.edges()))
+    eindex = {e: j for (j, e) in enumerate(edges)}
+    if not G.is_directed(): # an edge is found from both ends
+        eindex.update({(w, v): j for ((v, w), j) in eindex.items() if (w, v) not in eindex})
+    nbrs = [[index[w] for w in G.adj[v]] for v in nodes]
+    eids = [[eindex[(v, w)] for w in G.adj[v]] for v in nodes]
+    return (nodes, nbrs, eids, edges)
+
+def shortestpathstats(G, sources=None, stress=False, betweenness=False, edgebetweenness=False,
+  adj=None):
+    '''shortest path statistics of all nodes from a single BFS pass'''
+    # sources are processed one at a time and only per-node sums are kept,
+    # so memory use is linear in the graph size
+    # a subset of source nodes can be given; results for different subsets
+    # can be combined with mergepathstats()
+    # the search runs on node numbers and lists (see adjacency(), or give its result
+    # as adj), much faster than on dicts keyed by the node names
+    (nodes, nbrs, eids, edges) = adj or adjacency(G)
+    n = len(nodes)
+    if sources is None:
+        sources = range(n)
+    else:
+        index = {v: j for (j, v) in enumerate(nodes)}
+        sources = [index[v] for v in sources]
+    countpaths = stress or betweenness or edgebetweenness
+    ecc = {} # eccentricity (largest distance to a reachable node)
+    totdist = {} # sum of distances to reachable nodes
+    nreach = {} # number of reachable nodes, including the node itself
+    st = [0]*n # stress (number of shortest paths through the node)
+    bc = [0.0]*n # betweenness (not normalized)
+    ebc = [0.0]*len(edges) # edge betweenness
+    # per-node values for the current source, reset after each search
+    dist = [-1]*n # distance from s, -1 if not reached
+    sigma = [0]*n # number of shortest paths from s
+    pred = [None]*n # predecessors on shortest paths from s, with the edges used
+    below = [0]*n
+    delta = [0]*n # dependency of s on the node
+    for s in sources:
+        # breadth-first search from s; parallel edges do not count as separate paths
+        dist[s] = 0
+        order = [s] # nodes in order of increasing distance from s
+        sigma[s] = 1
+        pred[s] = []
+        for v in order: # order grows during the iteration
+            dw = dist[v]+1
+            if not countpaths:
+                for w in nbrs[v]:
+                    if dist[w] < 0:
+                        dist[w] = dw
+                        order.append(w)
+                continue
+            sv = sigma[v]
+            for (w, e) in zip(nbrs[v], eids[v]):
+                if dist[w] < 0:
+                    dist[w] = dw
+                    order.append(w)
+                    sigma[w] = sv
+                    pred[w] = [(v, e)]
+                elif dist[w] == dw:
+                    sigma[w] += sv
+                    pred[w].append((v, e))
+        ecc[nodes[s]] = dist[order[-1]]
+        totdist[nodes[s]] = sum(dist[v] for v in order)
+        nreach[nodes[s]] = len(order)
+        if countpaths:
+            # accumulate in reverse BFS order (Brandes' algorithm)
+            # below[v]: number of shortest paths leading from v to the nodes beyond it;
+            # each of them combines with the sigma[v] shortest paths from s to v
+            for w in reversed(order):
+                coeff = (1+delta[w])/sigma[w]
+                bw = 1+below[w]
+                for (v, e) in pred[w]:
+                    below[v] += bw
+                    c = sigma[v]*coeff
+                    ebc[e] += c
+                    delta[v] += c
+                if w != s:
+                    st[w] += sigma[w]*below[w]
+                    bc[w] += delta[w]
+            for v in order:
+                below[v] = 0
+                delta[v] = 0
+        for v in order:
+            dist[v] = -1
+    sp = {'ecc': ecc, 'totdist': totdist, 'nreach': nreach}
+    if stress:
+        sp['stress'] = dict(zip(nodes, st))
+    if betweenness:
+        sp['betweenness'] = dict(zip(nodes, bc))
+    if edgebetweenness:
+        sp['edgebetweenness'] = dict(zip(edges, ebc))
+    return sp
+
+def mergepathstats(sps):
+    '''merge shortest path statistics calculated for disjoint sets of source nodes'''
+    merged = {}
+    for sp in sps:
+        for key in sp:
+            if key not in merged:
+                merged[key] = dict(sp[key])
+            elif key in ['ecc', 'totdist', 'nreach']: # values for the source nodes
+                merged[key].update(sp[key])
+            else: # sums over the source nodes
+                dic = merged[key]
+                for k in sp[key]:
+                    dic[k] += sp[key][k]
+    return merged
+
+# the approximate mode (see calcquant): path counts from a random sample of source nodes,
+# distances from HyperLogLog counters of the nodes within each distance
+ANFREGISTERS = 128 # registers per HyperLogLog counter (relative error 1.04/sqrt of this)
+CONFIDENCE = 0.95 # probability for the reported error bound of the sampled betweenness
+
+def samplesources(G, samples, seed=0, pre=None):
+    '''random sample of source nodes of G (nodes are numbers) for shortestpathstats
+
+    samples nodes are taken from each connected component (all of them from smaller
+    components, which are thus analyzed exactly); as paths stay within components, the
+    work is at most that of samples searches of the whole graph. Returns (sources, factor):
+    factor maps each node to the inverse of the sampled fraction of its component.
+    '''
+    if pre is None:
+        pre = preprocess(G)
+    sources = []
+    factor = {}
+    for c in pre['components']:
+        c = sorted(c)
+        k = min(len(c), samples)
+        # the sample of a component does not depend on the rest of the network
+        rng = np.random.default_rng([seed, c[0]])
+        sources += [c[j] for j in sorted(rng.choice(len(c), size=k, replace=False))]
+        factor.update(dict.fromkeys(c, len(c)/k))
+    return (sorted(sources), factor)
+
+def scalepathstats(sp, factor):
+    '''estimates of the sums over all source nodes in sp from those over sampled ones
+    (see samplesources); the distance statistics of the sampled sources are dropped'''
+    scaled = {}
+    for key in ['stress', 'betweenness']:
+        if key in sp:
+            scaled[key] = {v: factor[v]*x for (v, x) in sp[key].items()}
+    if 'edgebetweenness' in sp:
+        scaled['edgebetweenness'] = {e: factor[e[0]]*x for (e, x) in
+          sp['edgebetweenness'].items()}
+    return scaled
+
+def hllcount(regs):
+    '''HyperLogLog estimates of the set sizes from the registers (one counter per row)'''
+    m = regs.shape[1]
+    alpha = 0.7213/(1+1.079/m)
+    est = alpha*m*m/np.exp2(-regs.astype(float)).sum(axis=1)
+    # small sets: linear counting from the number of empty registers
+    zeros = np.count_nonzero(regs == 0, axis=1)
+    small = (est <= 2.5*m) & (zeros > 0)
+    est[small] = m*np.log(m/zeros[small])
+    return est
+
+def nodehashes(nodes, seed=0):
+    '''pseudorandom 62-bit hashes of node numbers (splitmix64), as int64'''
+    with np.errstate(over='ignore'):
+        z = np.asarray(nodes, dtype=np.uint64)+np.uint64(seed+1)*np.uint64(0x9e3779b97f4a7c15)
+        z = (z ^ (z >> np.uint64(30)))*np.uint64(0xbf58476d1ce4e5b9)
+        z = (z ^ (z >> np.uint64(27)))*np.uint64(0x94d049bb133111eb)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(2)).astype(np.int64)
+
+def anfpathstats(G, seed=0):
+    '''approximate ecc, totdist, nreach (see shortestpathstats) of all nodes of G (nodes
+    are numbers)
+
+    The number of nodes within distance h from each node is estimated with HyperLogLog
+    counters (approximate neighborhood function): the counter of a node is merged with
+    those of its neighbors (successors) for h = 1, 2, ... until no counter changes.
+    Memory: ANFREGISTERS bytes per node and per edge.
+    '''
+    (nodes, nbrs, eids, edges) = adjacency(G)
+    n = len(nodes)
+    m = ANFREGISTERS
+    b = m.bit_length()-1
+    counts = np.array([len(x) for x in nbrs], dtype=np.int64)
+    tgt = np.fromiter(chain.from_iterable(nbrs), dtype=np.int64, count=counts.sum())
+    has = counts > 0
+    starts = (np.cumsum(counts)-counts)[has] # where the neighbors of each node start in tgt
+    # hash of each node: register index from the low bits, value from the trailing zeros
+    hashes = nodehashes(nodes, seed)
+    w = hashes >> b
+    rank = np.where(w > 0, np.log2((w & -w).astype(float)), 62-b).astype(np.uint8)+1
+    regs = np.zeros((n, m), dtype=np.uint8)
+    regs[np.arange(n), hashes & (m-1)] = rank
+    ecc = np.zeros(n, dtype=np.int64)
+    totdist = np.zeros(n)
+    nreach = np.ones(n) # within distance 0: the node itself
+    h = 0
+    while True:
+        h += 1
+        new = regs.copy()
+        if len(tgt):
+            new[has] = np.maximum(regs[has], np.maximum.reduceat(regs[tgt], starts, axis=0))
+        changed = (new != regs).any(axis=1)
+        if not changed.any():
+            break
+        # nodes reached first at distance h
+        count = np.maximum(hllcount(new[changed]), nreach[changed])
+        totdist[changed] += h*(count-nreach[changed])
+        nreach[changed] = count
+        ecc[changed] = h
+        regs = new
+    return {'ecc': dict(zip(nodes, ecc.tolist())), 'totdist': dict(zip(nodes, totdist.tolist())),
+      'nreach': dict(zip(nodes, nreach.tolist()))}
+
+# quantities given for the edges
+edgeqlist = ['EdgeBetweenness']
+# quantities calculated from the shared shortest path pass
+pathqlist = ['AverageShortestPathLength', 'BetweennessCentrality', 'ClosenessCentrality',
+  'Eccentricity', 'Radiality', 'Stress', 'EdgeBetweenness']
+# those only depending on the distances
+distqlist = ['AverageShortestPathLength', 'ClosenessCentrality', 'Eccentricity', 'Radiality']
+# quantities using the shared undirected view of the graph (see preprocess)
+preqlist = ['BetweennessCentrality', 'ClusteringCoefficient', 'Connectivity',
+  'NeighborhoodConnectivity', 'Radiality', 'SelfLoops', 'TopologicalCoefficient']
+
+def quantity(q, G, sp=None, pre=None):
+    '''calculate quantity q, with the shortest path statistics and the preprocessed graph if
+    they are used by it'''
+    kwargs = {'pre': pre} if q in preqlist else {}
+    if sp is not None:
+        kwargs['sp'] = sp
+    return eval(q)(G, **kwargs)
+
+# the graph analyzed by a worker process in parallel mode, its adjacency lists and
+# its preprocessed form (made when first needed)
+_G = None
+_adj = None
+_pre = None
+
+def _initworker(G):
+    global _G, _adj
+    _G = G
+    _adj = adjacency(G)
+
+def _pathworker(sources, kwargs):
+    return shortestpathstats(_G, sources=sources, adj=_adj, **kwargs)
+
+def _quantworker(q):
+    global _pre
+    if _pre is None and q in preqlist:
+        _pre = preprocess(_G)
+    return dict(quantity(q, _G, pre=_pre))
+
+def internnodes(nodes, sources, targets):
+    '''number the nodes of a network
+
+    nodes: node names (unique); sources, targets: node names at the two ends of the edges.
+    Nodes only found in the edges are numbered after those in nodes, in the order of their
+    first appearance. Returns (names, sourcenumbers, targetnumbers), the latter two are
+    int32 arrays.
+    '''
+    index = pd.Index(nodes)
+    ends = pd.Series(np.column_stack([sources, targets]).ravel())
+    numbers = index.get_indexer(ends)
+    if (numbers < 0).any(): # not in the node table
+        index = index.append(pd.Index(pd.unique(ends[numbers < 0])))
+        numbers = index.get_indexer(ends)
+    numbers = numbers.astype(np.int32).reshape(-1, 2)
+    return (list(index), numbers[:, 0], numbers[:, 1])
+
+COMPONENTBATCH = 10000 # smaller connected components are analyzed together up to this size
+
+def componentlabels(n, sources, targets):
+    '''number of the connected component of each node of a network with nodes 0..n-1 and
+    edges given by the node number arrays sources and targets (directions are ignored)'''
+    if scipy is not None:
+        A = scipy.sparse.coo_matrix((np.ones(len(sources), dtype=np.int32),
+          (sources, targets)), shape=(n, n))
+        return scipy.sparse.csgraph.connected_components(A, directed=False)[1]
+    H = nx.Graph()
+    H.add_nodes_from(range(n))
+    H.add_edges_from(zip(sources.tolist(), targets.tolist()))
+    labels = np.zeros(n, dtype=np.int64)
+    for (j, c) in enumerate(nx.connected_components(H)):
+        labels[list(c)] = j
+    return labels
+
+def groupcomponents(labels, batchsize=COMPONENTBATCH):
+    '''group connected components into batches for separate analysis, smallest first
+
+    labels: component number of each node. Components smaller than batchsize are put
+    together up to batchsize nodes, larger ones are alone in their batch. Returns the
+    batch number of each node and the sizes of the batches.
+    '''
+    sizes = np.bincount(labels).tolist()
+    batchof = np.zeros(len(sizes), dtype=np.int64)
+    batchsizes = []
+    for c in np.argsort(sizes, kind='stable').tolist():
+        if not batchsizes or batchsizes[-1]+sizes[c] > batchsize:
+            batchsizes.append(0)
+        batchof[c] = len(batchsizes)-1
+        batchsizes[-1] += sizes[c]
+    return (batchof[labels], batchsizes)
+
+def makegraph(nodes, sources, targets, directed, multi=True):
+    '''networkx graph with the given node numbers and edges (node number arrays); parallel
+    edges are represented by a single edge with their number as 'multiplicity' attribute
+
+    multi: whether the network is a multigraph, i.e. the edge table has the same edge more
+    than once (in the same direction). If not, an edge of an undirected network given in
+    both directions is a single edge rather than two parallel ones.
+    '''
+    G = nx.DiGraph() if directed else nx.Graph()
+    G.add_nodes_from(nodes.tolist())
+    m = int(nodes.max())+1 if len(nodes) else 1
+    if directed:
+        pairs = sources.astype(np.int64)*m+targets
+    else: # the two directions are the same edge
+        pairs = (np.minimum(sources, targets).astype(np.int64)*m+
+          np.maximum(sources, targets))
+    (first, counts) = np.unique(pairs, return_index=True, return_counts=True)[1:]
+    if len(first) == len(pairs) or not multi: # no parallel edges
+        G.add_edges_from(zip(sources.tolist(), targets.tolist()))
+        return G
+    # edges in the order of their first appearance, like in a multigraph
+    order = np.argsort(first)
+    (first, counts) = (first[order], counts[order])
+    G.add_edges_from((u, v, {'multiplicity': k}) for (u, v, k) in zip(
+      sources[first].tolist(), targets[first].tolist(), counts.tolist()))
+    return G
+
+def analyzegraph(G, quantities, jobs=1, backend='networkx', samples=None, seed=0):
+    '''calculate quantities for graph G whose nodes are numbers (see calcquant)
+
+    Returns a dict: quantity -> dict of the values, with nodes or edges (node number
+    pairs) as keys.
+    '''
+    # traverse the graph only once for all shortest path based quantities
+    sp = None
+    spkwargs = {'stress': 'Stress' in quantities,
+                'betweenness': 'BetweennessCentrality' in quantities,
+                'edgebetweenness': 'EdgeBetweenness' in quantities}
+    needpaths = any(q in pathqlist for q in quantities)
+    # the undirected view of the graph is made once for all quantities using it
+    pre = None
+    if any(q in preqlist for q in quantities) or samples is not None:
+        pre = preprocess(G)
+    # only approximate if a component is larger than the sample
+    approx = samples is not None and any(len(c) > samples for c in pre['components'])
+    pivots = None
+    if approx:
+        # the path pass is only needed for path counts, from the sampled source nodes
+        needdist = any(q in distqlist for q in quantities)
+        needpaths = any(spkwargs.values())
+        if needpaths:
+            (pivots, factor) = samplesources(G, samples, seed, pre)
+    dics = {}
+    # calculate what is possible with the backend library, the rest with networkx
+    if backend != 'networkx':
+        (dics, sp) = nabackends.calculate(backend, G, [q for q in quantities
+          if q not in pathqlist], spkwargs if needpaths and not approx else None)
+        if sp:
+            # path statistics not provided by the backend
+            spkwargs = {k: spkwargs[k] and k not in sp for k in spkwargs}
+            needpaths = any(spkwargs.values())
+        else:
+            sp = None
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_initworker, 
+          initargs=(G,)) as pool:
+            # independent quantities are calculated by separate workers
+            futures = {q: pool.submit(_quantworker, q) for q in quantities
+              if q not in pathqlist and q not in dics}
+            # the shortest path pass is split into chunks of source nodes
+            if needpaths:
+                nodes = pivots if approx else list(G)
+                # several chunks per worker for load balancing
+                nchunks = max(1, min(len(nodes), 4*jobs))
+                chunks = [nodes[j::nchunks] for j in range(nchunks)]
+                sp = dict(sp or {}, **mergepathstats(pool.map(_pathworker, chunks, 
+                  [spkwargs]*nchunks)))
+            dics.update({q: futures[q].result() for q in futures})
+    elif needpaths:
+        sp = dict(sp or {}, **shortestpathstats(G, sources=pivots, **spkwargs))
+    if approx:
+        if needpaths:
+            sp = scalepathstats(sp, factor)
+        if needdist:
+            sp = dict(sp or {}, **anfpathstats(G, seed))
+    for q in quantities:
+        if q not in dics:
+            dics[q] = quantity(q, G, sp if q in pathqlist else None, pre)
+    return dics
+
+def _batchworker(nodes, sources, targets, directed, multi, quantities, backend, samples,
+  seed):
+    G = makegraph(nodes, sources, targets, directed, multi)
+    return analyzegraph(G, quantities, 1, backend, samples, seed)
+
+def calcquant(nodetab, idcol, edgetab, sourcecol, targetcol, directed, quant='all', jobs=1,
+  cache=None, backend='networkx', samples=None, seed=0):
+    '''calculate the requested quantities for network
+
+    The connected components are analyzed separately (small ones together in batches of
+    up to COMPONENTBATCH nodes), smallest first, so memory use depends on the size of the
+    largest component rather than that of the network.
+    With jobs > 1, the batches of small components are analyzed in parallel by a pool of
+    worker processes; for large components, the quantities are calculated in parallel and
+    the shortest path pass is split into chunks of source nodes.
+    If an AnalysisCache is given, quantities found in it are not recalculated,
+    and newly calculated ones are stored in it. With backend igraph or csgraph,
+    the quantities available there are calculated by these libraries (see nabackends).
+    If samples is given and smaller than the largest component, the shortest path based
+    quantities are approximated: path counts (betweenness, stress) are estimated from
+    a random sample of this many source nodes per component, distances with HyperLogLog
+    counters (see anfpathstats); seed makes the results reproducible.
+    '''
     common_qlist = ['Degree',
       'Connectivity',
       'AverageShortestPathLength',
@@ -162,19 +636,7 @@ def calcquant(nodetab, idcol, edgetab, sourcecol, targetcol, directed, quant='al
       'Stress']
     dironly_qlist = ['Indegree', 'Outdegree']
     undironly_qlist = ['Radiality', 'TopologicalCoefficient']
-    edgeqlist = ['EdgeBetweenness']
     notimplemented = []
-    edgelist = list(zip(list(edgetab[sourcecol]), list(edgetab[targetcol])))
-    ismulti = len(edgelist) > len(set(edgelist))
-    
-    if directed:
-        G = nx.MultiDiGraph() if ismulti else nx.DiGraph()
-    else:
-        G = nx.MultiGraph() if ismulti else nx.Graph()
-    #print('graph interpreted as', type(G))
-    
-    G.add_nodes_from(list(nodetab[idcol]))
-    G.add_edges_from(edgelist)
     
     if quant == 'all':
         quantities = common_qlist+edgeqlist+(dironly_qlist if directed else undironly_qlist)
@@ -190,8 +652,6 @@ def calcquant(nodetab, idcol, edgetab, sourcecol, targetcol, directed, quant='al
     validq = common_qlist+dironly_qlist+undironly_qlist+edgeqlist
     kwcheck(quantities, validq, name='quantity|quantities', context=' in networkanalysis')
     
-    nodeqdic = OrderedDict()
-    edgeqdic = OrderedDict()
     for q in quantities:
         if q in notimplemented:
             raise ValueError('Not yet implemented: '+q)
@@ -199,13 +659,108 @@ def calcquant(nodetab, idcol, edgetab, sourcecol, targetcol, directed, quant='al
             raise ValueError('Quantity not available for directed network: '+q)
         if not directed and q in dironly_qlist:
             raise ValueError('Quantity not available for undirected network: '+q)
-        func = eval(q)
-        if q in edgeqlist:
-            dic = func(G) # dictionary with edges as keys
-            # edge (u, v) may appear as (v, u) for undirected graphs, deal with it
-            edgeqdic[q] = [dic[e] if e in dic else dic[e[::-1]] for e in zip(edgetab[sourcecol], 
-              edgetab[targetcol])]
+    
+    # the graph is built on node numbers rather than names
+    (names, sources, targets) = internnodes(nodetab[idcol], edgetab[sourcecol], 
+      edgetab[targetcol])
+    n = len(names)
+    labels = componentlabels(n, sources, targets)
+    (batchof, batchsizes) = groupcomponents(labels, COMPONENTBATCH)
+    
+    largest = np.bincount(labels).max() if n else 0
+    approx = samples is not None and samples < largest
+    # approximate values are cached separately from the exact ones
+    variant = 'samples=%d seed=%d' % (samples, seed) if approx else ''
+    variants = {q: variant if q in pathqlist else '' for q in quantities}
+    
+    # take quantities from the cache if possible
+    cached = {}
+    if cache:
+        netkey = cache.networkkey(nodetab[idcol], edgetab[sourcecol], edgetab[targetcol], directed)
+        for q in quantities:
+            values = cache.get(netkey, q, variants[q])
+            if values is not None:
+                cached[q] = values
+    tocalc = [q for q in quantities if q not in cached]
+    
+    # a multigraph if an edge is given more than once in the same direction; otherwise
+    # an edge of an undirected network given in both directions counts once
+    pairs = sources.astype(np.int64)*n+targets
+    multi = len(np.unique(pairs)) < len(pairs)
+    if 'ClusteringCoefficient' in tocalc:
+        if multi: # clustering coefficient is not defined
+            print('Warning: parallel edges are counted once in the clustering coefficient '
+              'calculation')
+    if approx:
+        pathcounts = [q for q in tocalc if q in pathqlist and q not in distqlist]
+        if pathcounts:
+            # Hoeffding bound for the normalized betweenness of a connected network
+            eps = math.sqrt(math.log(2/(1-CONFIDENCE))/(2*samples))
+            nsources = np.minimum(np.bincount(labels), samples).sum()
+            print('Approximate network analysis: %s estimated from %d of %d source nodes '
+              '(seed %d); error of BetweennessCentrality below %.3g with %g%% probability' % (
+              ', '.join(pathcounts), nsources, n, seed, eps, 100*CONFIDENCE))
+        if any(q in distqlist for q in tocalc):
+            print('Approximate network analysis: %s estimated with HyperLogLog counters '
+              '(seed %d); relative standard error of the reachable node counts %.1f%%, '
+              'Eccentricity is a lower bound' % (', '.join(q for q in tocalc if q in distqlist),
+              seed, 104/math.sqrt(ANFREGISTERS)))
+    
+    # nodes and edges of each batch
+    nbatches = len(batchsizes)
+    nodeorder = np.argsort(batchof, kind='stable')
+    nodebounds = np.searchsorted(batchof[nodeorder], np.arange(nbatches+1))
+    edgebatch = batchof[sources]
+    edgeorder = np.argsort(edgebatch, kind='stable')
+    edgebounds = np.searchsorted(edgebatch[edgeorder], np.arange(nbatches+1))
+    def batch(b):
+        rows = edgeorder[edgebounds[b]:edgebounds[b+1]]
+        return (nodeorder[nodebounds[b]:nodebounds[b+1]], sources[rows], targets[rows], rows)
+    
+    # the values are stored as the batches are finished
+    values = {q: [None]*(len(sources) if q in edgeqlist else n) for q in tocalc}
+    def store(b, dics):
+        (bnodes, bsources, btargets, rows) = batch(b)
+        for q in dics:
+            dic = dics[q]
+            if q in edgeqlist:
+                # dic: dictionary with edges as keys
+                # edge (u, v) may appear as (v, u) for undirected graphs, deal with it
+                for (r, e) in zip(rows.tolist(), zip(bsources.tolist(), btargets.tolist())):
+                    values[q][r] = dic[e] if e in dic else dic[e[::-1]]
+            else:
+                # dic: dictionary with node numbers as keys
+                for v in bnodes.tolist():
+                    values[q][v] = dic[v]
+    
+    if tocalc:
+        small = [b for b in range(nbatches) if batchsizes[b] <= COMPONENTBATCH]
+        large = [b for b in range(nbatches) if batchsizes[b] > COMPONENTBATCH]
+        if jobs > 1 and len(small) > 1:
+            # small batches are analyzed by separate workers
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = {pool.submit(_batchworker, *batch(b)[:3], directed, multi, tocalc,
+                  backend, samples, seed): b for b in small}
+                for future in as_completed(futures):
+                    store(futures.pop(future), future.result())
         else:
-            dic = func(G) # dictionary with nodes as keys
-            nodeqdic[q] = [dic[v] for v in nodetab[idcol]]
+            large = small+large
+        for b in large:
+            G = makegraph(*batch(b)[:3], directed, multi)
+            store(b, analyzegraph(G, tocalc, jobs, backend, samples, seed))
+            del G
+    
+    nodeqdic = OrderedDict()
+    edgeqdic = OrderedDict()
+    for q in quantities:
+        qdic = edgeqdic if q in edgeqlist else nodeqdic
+        if q in cached:
+            qdic[q] = cached[q]
+            continue
+        # the node table comes first
+        qdic[q] = values[q] if q in edgeqlist else values[q][:len(nodetab)]
+        if cache:
+            cache.put(netkey, q, qdic[q], variants[q])
+    if cached:
+        print('Network analysis results taken from cache:', ', '.join(cached))
     return (nodeqdic, edgeqdic)
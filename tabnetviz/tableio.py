@@ -0,0 +1,222 @@
+'''reading and writing node and edge tables for tabnetviz'''
+
+# Copyright 2019 Andras Szilagyi
+# Distributed under the GNU General Public License v3
+# See https://www.gnu.org/licenses/gpl-3.0.html
+
+import os
+import json
+import hashlib
+
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+    import pyarrow.feather
+    import pyarrow.ipc
+except ImportError: # optional, only needed for the columnar formats
+    pyarrow = None
+
+# column separators of text table formats
+sepchar = {'csv': ',', 'tsv': '\t'}
+
+# file name extensions of the table formats
+extensions = {'csv': 'csv', 'tsv': 'tsv', 'xlsx': 'xlsx', 'xls': 'xlsx', 'parquet': 'parquet',
+  'pq': 'parquet', 'feather': 'feather', 'arrow': 'arrow', 'ipc': 'arrow'}
+columnar = ['parquet', 'feather', 'arrow']
+csvengines = ['c', 'python', 'pyarrow'] # parsers of pd.read_csv
+
+# with the categorical option, string columns with at most this fraction of distinct values
+# are made categorical (in tables of at least CATEGORYMINROWS rows)
+CATEGORYMAXFRACTION = 0.01
+CATEGORYMINROWS = 10000
+
+def filetype(fname):
+    '''table file type from the file name extension, or None if not known'''
+    return extensions.get(fname.rsplit('.', 1)[-1].lower())
+
+def needpyarrow(ftype):
+    if pyarrow is None:
+        raise ValueError('The pyarrow module is needed for %s files; install it with '
+          '"pip install pyarrow"' % (ftype))
+
+def columnnames(fname, ftype, header=0, sheet=0):
+    '''list of the column names in a table file, or None if they cannot be read quickly'''
+    if header is None:
+        return None
+    if ftype in sepchar:
+        return list(pd.read_csv(fname, sep=sepchar[ftype], nrows=0).columns)
+    elif ftype in ['xlsx', 'xls']:
+        return list(pd.read_excel(fname, sheet_name=sheet, nrows=0).columns)
+    elif ftype in columnar and pyarrow:
+        if ftype == 'parquet':
+            return pyarrow.parquet.read_schema(fname, memory_map=True).names
+        source = pyarrow.memory_map(fname)
+        try:
+            return pyarrow.ipc.open_file(source).schema.names
+        except pyarrow.ArrowInvalid: # not the file format (arrow stream or old feather)
+            pass
+        if ftype == 'arrow':
+            source.seek(0)
+            return pyarrow.ipc.open_stream(source).schema.names
+    return None
+
+def readtable(fname, ftype, header=0, sheet=0, columns=None, engine=None, dtype=None):
+    '''read a table file into a DataFrame
+
+    columns: list of column names to read (all if None); for columnar formats, only
+    these columns are read from the file. Columnar files are memory-mapped.
+    engine: parser for csv/tsv files (see csvengines), default: 'c'
+    dtype: dict of column dtypes for csv/tsv files, for the columns not to be inferred
+    '''
+    if ftype is None:
+        raise ValueError('Cannot tell the file type of table %s from its name; please '
+          'specify it with filetype' % (fname))
+    if ftype in sepchar:
+        if engine not in csvengines+[None]:
+            raise ValueError('Unknown csv engine: %s (should be one of %s)' % (engine,
+              ', '.join(csvengines)))
+        if engine == 'pyarrow':
+            needpyarrow('csvengine pyarrow')
+        if dtype and columns is not None:
+            dtype = {c: dtype[c] for c in dtype if c in columns}
+        return pd.read_csv(fname, sep=sepchar[ftype], header=header, usecols=columns,
+          engine=engine, dtype=dtype or None)
+    elif ftype in ['xlsx', 'xls']:
+        return pd.read_excel(fname, header=header, sheet_name=sheet, usecols=columns)
+    elif ftype == 'parquet':
+        needpyarrow(ftype)
+        table = pyarrow.parquet.read_table(fname, columns=columns, memory_map=True)
+    elif ftype in ['feather', 'arrow']:
+        table = ipctable(fname, ftype, columns)
+    else:
+        raise ValueError('Unknown file type for table %s: %s' % (fname, ftype))
+    return table.to_pandas()
+
+def ipctable(fname, ftype, columns=None):
+    '''read a feather or arrow file into a pyarrow Table'''
+    needpyarrow(ftype)
+    if ftype == 'feather':
+        return pyarrow.feather.read_table(fname, columns=columns, memory_map=True)
+    source = pyarrow.memory_map(fname)
+    try:
+        table = pyarrow.ipc.open_file(source).read_all()
+    except pyarrow.ArrowInvalid: # not the file format, try the stream format
+        source.seek(0)
+        table = pyarrow.ipc.open_stream(source).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return table
+
+def readchunks(fname, ftype, chunksize, header=0, sheet=0, columns=None, engine=None,
+  dtype=None):
+    '''read a table file in chunks of chunksize rows, yield DataFrames
+
+    The row index continues from chunk to chunk as if the whole table was read.
+    Excel files are read in one piece. Arguments as for readtable.
+    '''
+    if ftype in sepchar:
+        if engine == 'pyarrow': # pandas cannot read in chunks with pyarrow
+            engine = 'c'
+        if dtype and columns is not None:
+            dtype = {c: dtype[c] for c in dtype if c in columns}
+        with pd.read_csv(fname, sep=sepchar[ftype], header=header, usecols=columns,
+          engine=engine, dtype=dtype or None, chunksize=chunksize) as reader:
+            yield from reader
+        return
+    if ftype == 'parquet':
+        needpyarrow(ftype)
+        batches = pyarrow.parquet.ParquetFile(fname, memory_map=True).iter_batches(
+          batch_size=chunksize, columns=columns)
+    elif ftype in ['feather', 'arrow']:
+        batches = ipctable(fname, ftype, columns).to_batches(max_chunksize=chunksize)
+    else:
+        yield readtable(fname, ftype, header=header, sheet=sheet, columns=columns)
+        return
+    start = 0
+    for batch in batches:
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start+len(chunk))
+        start += len(chunk)
+        yield chunk
+
+def concatchunks(chunks):
+    '''concatenate DataFrames read in chunks, keeping categorical columns categorical'''
+    tab = pd.concat(chunks)
+    for c in chunks[0].columns:
+        if (isinstance(chunks[0][c].dtype, pd.CategoricalDtype) and 
+          not isinstance(tab[c].dtype, pd.CategoricalDtype)): # different categories
+            tab[c] = pd.api.types.union_categoricals([chunk[c] for chunk in chunks])
+    return tab
+
+def writetable(tab, fname):
+    '''write a table; the format is determined by the file name extension'''
+    ftype = filetype(fname)
+    if ftype in sepchar:
+        tab.to_csv(fname, sep=sepchar[ftype], index=False)
+    elif ftype == 'xlsx':
+        tab.to_excel(fname, index=False)
+    elif ftype in columnar:
+        needpyarrow(ftype)
+        table = pyarrow.Table.from_pandas(tab, preserve_index=False)
+        if ftype == 'parquet':
+            pyarrow.parquet.write_table(table, fname)
+        else: # feather version 2 is the arrow IPC file format
+            pyarrow.feather.write_feather(table, fname)
+    else:
+        raise ValueError('Unknown file type for table %s' % (fname))
+
+def categorize(tab, keycolumns):
+    '''convert the string columns of table tab with few distinct values (except keycolumns,
+    the node id or source and target columns) to categoricals, in place'''
+    for c in tab.columns:
+        col = tab[c]
+        if (c not in keycolumns and len(col) >= CATEGORYMINROWS and
+          pd.api.types.is_string_dtype(col.dtype) and
+          col.nunique() <= CATEGORYMAXFRACTION*len(col)):
+            tab[c] = col.astype('category')
+
+class DtypeCache():
+    '''column dtypes of csv/tsv tables read with the categorical option in earlier runs
+
+    Once cached, the columns made categorical by categorize are parsed as categoricals
+    directly, which is faster and saves memory. One small json file per table file; the
+    entry is discarded when the file changes.
+    '''
+    def __init__(self, dirname):
+        self.dirname = dirname
+    def filename(self, fname):
+        key = hashlib.sha256(os.path.abspath(fname).encode()).hexdigest()
+        return os.path.join(self.dirname, key+'.dtypes.json')
+    def stamp(self, fname, header, engine):
+        '''identifies the table file version and the way it is read'''
+        st = os.stat(fname)
+        return [st.st_size, st.st_mtime_ns, header, engine or 'c']
+    def get(self, fname, header, engine):
+        '''return the cached dtypes as a dict (column name -> dtype), or {}'''
+        try:
+            with open(self.filename(fname)) as f:
+                entry = json.load(f)
+            if entry['stamp'] != self.stamp(fname, header, engine):
+                return {}
+            return {c: pd.api.types.pandas_dtype(t) for (c, t) in entry['dtypes']}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+    def put(self, fname, header, engine, tab):
+        '''store the dtypes of table tab, just read from file fname (and categorized)'''
+        dtypes = self.get(fname, header, engine)
+        if all(c in dtypes for c in tab.columns): # nothing new
+            return
+        for c in tab.columns:
+            dtypes[c] = tab[c].dtype
+        entry = {'stamp': self.stamp(fname, header, engine),
+          'dtypes': [(c, str(dtypes[c])) for c in dtypes]}
+        try:
+            os.makedirs(self.dirname, exist_ok=True)
+            tmpname = self.filename(fname)+'.%d.tmp' % (os.getpid())
+            with open(tmpname, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmpname, self.filename(fname))
+        except (OSError, TypeError) as e:
+            print('Warning: could not write table dtype cache:', e)
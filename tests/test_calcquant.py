@@ -0,0 +1,28 @@
+'''edges given more than once in the edge table'''
+
+import pandas as pd
+import pytest
+
+from tabnetviz import netanalyzer
+
+def analyze(edges, directed=False, **kwargs):
+    nodetab = pd.DataFrame({'name': list('abcd')}, index=list('abcd'))
+    edgetab = pd.DataFrame(edges, columns=['source', 'target'])
+    (nodeq, edgeq) = netanalyzer.calcquant(nodetab, 'name', edgetab, 'source', 'target',
+      directed, quant=['Degree', 'EdgeBetweenness'], **kwargs)
+    return (list(nodeq['Degree']), list(edgeq['EdgeBetweenness']))
+
+@pytest.mark.parametrize('backend', ['networkx', 'igraph', 'csgraph'])
+def test_reversed_pair(backend):
+    # without repeated edges, an undirected edge given in both directions counts once
+    assert analyze([('a', 'b'), ('b', 'a'), ('b', 'c'), ('c', 'd')], backend=backend) == (
+      [1, 2, 2, 1], [6, 6, 8, 6])
+
+def test_multigraph():
+    # with a repeated edge, the network is a multigraph and the reversed pair is parallel
+    assert analyze([('a', 'b'), ('b', 'a'), ('b', 'c'), ('c', 'd'), ('c', 'd')]) == (
+      [2, 3, 3, 2], [3, 3, 8, 3, 3])
+
+def test_directed():
+    assert analyze([('a', 'b'), ('b', 'a'), ('b', 'c'), ('c', 'd')], directed=True) == (
+      [2, 3, 2, 1], [3, 1, 4, 3])
@@ -0,0 +1,47 @@
+'''reusing the layout of a dot file written by tabnetviz'''
+
+import argparse
+
+import pygraphviz as pgv
+import pytest
+
+from tabnetviz.__main__ import table2net
+
+def run(configfile):
+    args = argparse.Namespace(configfile=configfile, nodetable=None, edgetable=None,
+      output=None, nodetableout=None, edgetableout=None, jobs=None, watch=False,
+      csvengine=None, no_cache=True)
+    table2net(args)
+
+def positions(fname):
+    G = pgv.AGraph(fname)
+    return ({str(v): v.attr['pos'] for v in G.nodes()},
+      {(str(u), str(v), x): G.get_edge(u, v, key=x).attr['pos'] for (u, v, x) in
+      G.edges(keys=True)})
+
+def test_nodes_only_in_edge_table(tmp_path, monkeypatch):
+    # d and e are only in the edge table
+    monkeypatch.chdir(tmp_path)
+    (tmp_path/'nodes.csv').write_text('name\na\nb\nc\n')
+    (tmp_path/'edges.csv').write_text('source,target\na,b\nb,c\nc,d\nd,e\n')
+    (tmp_path/'first.yaml').write_text('edgetable: edges.csv\nnodetable: nodes.csv\n'
+      'outputfiles:\n  dot: first.dot\n')
+    run('first.yaml')
+    (tmp_path/'second.yaml').write_text('edgetable: edges.csv\nnodetable: nodes.csv\n'
+      'layout: first.dot\noutputfiles:\n  dot: second.dot\n')
+    run('second.yaml')
+    (nodepos, edgepos) = positions('first.dot')
+    assert set(nodepos) == set('abcde')
+    assert positions('second.dot') == (nodepos, edgepos)
+
+def test_different_graph(tmp_path, monkeypatch):
+    # same number of nodes and edges, one edge changed
+    monkeypatch.chdir(tmp_path)
+    (tmp_path/'edges.csv').write_text('source,target\na,b\nb,c\nc,d\n')
+    (tmp_path/'first.yaml').write_text('edgetable: edges.csv\noutputfiles:\n  dot: first.dot\n')
+    run('first.yaml')
+    (tmp_path/'edges.csv').write_text('source,target\na,b\nb,c\nd,a\n')
+    (tmp_path/'second.yaml').write_text('edgetable: edges.csv\nlayout: first.dot\n'
+      'outputfiles:\n  dot: second.dot\n')
+    with pytest.raises(ValueError, match='differs'):
+        run('second.yaml')
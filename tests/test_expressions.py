@@ -0,0 +1,45 @@
+'''column expressions evaluated with numexpr or pandas give the same results'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tabnetviz import expressions
+
+DTYPES = ['int8', 'int16', 'int32', 'int64', 'uint8', 'uint16', 'uint32', 'uint64',
+  'float32', 'float64']
+
+EXPRESSIONS = ['a - 5', '-a', 'a*100', 'a + b', 'a*2', 'a/b', 'a - b*3.5', 'a > 3',
+  'a >= b', '2 < a <= 200', '(a > 3) & (b < 100)', '(a == 1) | ~(b != 2)', 'not a > 3',
+  'a*b + 7']
+
+def table(dtype):
+    '''table with columns a and b of the given dtype, near the limits of narrow types'''
+    values = [1, 2, 3, 100, 127, 200, 250, 255] if dtype != 'int8' else [1, 2, 3, 100, 127]
+    if dtype.startswith('int') and dtype != 'int8':
+        values += [-3, -128]
+    return pd.DataFrame({'a': np.array(values, dtype=dtype),
+      'b': np.array(values[::-1], dtype=dtype), 'c': [True, False]*(len(values)//2)+
+      [True]*(len(values) % 2)})
+
+@pytest.mark.parametrize('dtype', DTYPES)
+@pytest.mark.parametrize('expr', EXPRESSIONS)
+def test_numeric(dtype, expr):
+    tab = table(dtype)
+    with np.errstate(all='ignore'):
+        expected = tab.eval(expr, engine='python')
+        result = expressions.parse(expr).evaluate(tab)
+    pd.testing.assert_series_equal(result, expected, check_names=False)
+
+@pytest.mark.parametrize('expr', ['c', 'c & (a > 3)', '~c | (a == 1)', 'not c'])
+def test_boolean(expr):
+    tab = table('int64')
+    pd.testing.assert_series_equal(expressions.parse(expr).evaluate(tab),
+      tab.eval(expr, engine='python'), check_names=False)
+
+@pytest.mark.skipif(expressions.numexpr is None, reason='numexpr is not installed')
+def test_numexpr_used():
+    tab = table('int64')
+    expr = expressions.parse('a*2 + b > 3')
+    assert expr.numexpr and expr.numexprok(tab)
+    assert not expr.numexprok(table('uint8'))
@@ -0,0 +1,47 @@
+'''drawing the graph with a cached layout'''
+
+import argparse
+
+from tabnetviz.__main__ import table2net
+
+def run(configfile):
+    args = argparse.Namespace(configfile=configfile, nodetable=None, edgetable=None,
+      output=None, nodetableout=None, edgetableout=None, jobs=None, watch=False,
+      csvengine=None, no_cache=False)
+    table2net(args)
+
+def test_same_dot_file(tmp_path, monkeypatch, capsys):
+    # e is only in the edge table; nodes, edges, clusters and the graph have labels
+    monkeypatch.chdir(tmp_path)
+    (tmp_path/'nodes.csv').write_text('name,group\na,1\nb,1\nc,2\nd,2\n')
+    (tmp_path/'edges.csv').write_text('source,target,w\na,b,x1\nb,c,x2\nc,d,x3\nd,a,x4\n'
+      'a,e,x5\n')
+    (tmp_path/'config.yaml').write_text('''edgetable: edges.csv
+nodetable: nodes.csv
+networktype: directed
+layout: dot
+graphattrs:
+  label: Test graph
+nodegroups:
+  one: group == 1
+clusters:
+  one:
+    label: Cluster one
+nodestyles:
+  default:
+    xlabel: name
+    shape: record
+    label: "{a|b}"
+edgestyles:
+  default:
+    label: w
+    headlabel: w
+    taillabel: w
+outputfiles:
+  dot: out.dot
+''')
+    run('config.yaml')
+    cold = (tmp_path/'out.dot').read_text()
+    run('config.yaml')
+    assert 'Using cached layout' in capsys.readouterr().out
+    assert (tmp_path/'out.dot').read_text() == cold
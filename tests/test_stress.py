@@ -0,0 +1,54 @@
+'''Stress from shortestpathstats compared to the original per-pair implementation'''
+
+import os
+
+import networkx as nx
+import pandas as pd
+import pytest
+
+from tabnetviz import netanalyzer
+
+DOCS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docs')
+
+def oldstress(G):
+    '''Stress as calculated by tabnetviz 1.2, by enumerating all shortest paths'''
+    # shortest paths
+    paths = []
+    # v is part of how many shortest paths
+    for u in G:
+        for v in G:
+            if v == u:
+                continue
+            if not nx.has_path(G, u, v):
+                continue
+            for path in nx.all_shortest_paths(G, u, v):
+                paths.append(path[1:-1])
+    col = {v: [v in path for path in paths].count(True) for v in G}
+    return col
+
+def edges(fname):
+    '''(source, target) pairs of an edge table in docs/'''
+    tab = pd.read_csv(os.path.join(DOCS, fname))
+    return list(zip(tab['source'].astype(str), tab['target'].astype(str)))
+
+def graphs():
+    '''test graphs from the sample tables: simple graphs and multigraphs (with parallel
+    edges and self-loops), directed and undirected, connected and disconnected'''
+    tables = {'tnv': edges('tnv-edges.csv'), 'top20': edges('top20edgetable.csv'),
+      'galFiltered': edges('galFiltered.csv')}
+    # two networks side by side
+    tables['disconnected'] = tables['tnv']+[('t'+u, 't'+v) for (u, v) in tables['top20']]
+    # some edges repeated and reversed, plus self-loops
+    tables['multi'] = (tables['top20']+tables['top20'][::3]+[(v, u) for (u, v) in
+      tables['top20'][::5]]+[(u, u) for (u, v) in tables['top20'][::7]])
+    for (name, edgelist) in tables.items():
+        for gtype in [nx.Graph, nx.DiGraph, nx.MultiGraph, nx.MultiDiGraph]:
+            if name == 'galFiltered' and gtype in [nx.Graph, nx.MultiGraph]:
+                continue # too slow with the old implementation (galFiltered.yaml is directed)
+            yield pytest.param(gtype(edgelist), id='%s-%s' % (name, gtype.__name__))
+
+@pytest.mark.parametrize('G', list(graphs()))
+def test_stress(G):
+    expected = oldstress(G)
+    assert netanalyzer.shortestpathstats(G, stress=True)['stress'] == expected
+    assert netanalyzer.Stress(G) == expected